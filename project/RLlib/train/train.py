@@ -27,7 +27,7 @@ ModelCatalog.register_custom_model('centralized_model', CentralizedCriticModel)
 def train(args):
     """contract training function"""
     env_name = "AdaSociety"
-    env_config = {'env_dir': args.env_dir}
+    env_config = {'env_dir': args.env_dir, 'obs_mode': args.obs_mode}
     register_env(env_name, lambda config: RllibEnvWrapper(config))
     dummy_env = RllibEnvWrapper(env_config)
     model_config_dict, obs_space_dict, action_space_dict = get_spaces_and_model_config(dummy_env, args)
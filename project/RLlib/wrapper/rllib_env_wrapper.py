@@ -1,13 +1,20 @@
 from ...env.environment import Environment
+from ...utils.config_loader import ConfigLoader
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from gymnasium.spaces import Box
 from pydoc import locate
 
 class RllibEnvWrapper(MultiAgentEnv):
     def __init__(self, config) -> None:
-        self.env = Environment(config['env_dir'])
-        EnvHandler = locate(self.env.config_loader.task['env_handler'])
+        config_loader = ConfigLoader(config['env_dir'])
+        EnvHandler = locate(config_loader.task['env_handler'])
         self.env_handler = EnvHandler(config['env_dir'])
+        # Tensor observations are opt-in, for agents that can read them
+        self.obs_mode = config.get('obs_mode', 'dict')
+        if self.obs_mode not in getattr(self.env_handler.AgentClass, 'obs_modes', ('dict',)):
+            raise ValueError(f'{self.env_handler.AgentClass.__name__} does not read `{self.obs_mode}` observations')
+        self.grid_view = getattr(self.env_handler.AgentClass, 'grid_view', 'fov')
+        self.env = Environment(config['env_dir'], obs_mode=self.obs_mode, grid_view=self.grid_view)
         self.get_spaces()
 
     def reset(self, *, seed=None, options=None):
@@ -18,12 +25,13 @@ class RllibEnvWrapper(MultiAgentEnv):
 
     def step(self, actions):
         actions = self.env_handler.on_predict(actions)
-        obs, reward, terminated, truncated, info = self.env.step(actions)
+        # Only the agents that acted are observed, so terminated ones are not observed any more
+        obs, reward, terminated, truncated, info = self.env.step(actions, obs_agents=list(actions))
         obs, reward, terminated, truncated, info = self.env_handler.on_update(obs, reward, terminated, truncated, info)
         return obs, reward, terminated, truncated, info
 
     def get_spaces(self):
-        dummy_env = Environment()
+        dummy_env = Environment(obs_mode=self.obs_mode, grid_view=self.grid_view)
         obs, info = dummy_env.reset()
         self.env_handler.on_reset(obs, info)
         self.observation_space = {
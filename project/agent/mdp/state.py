@@ -21,6 +21,9 @@ class State:
         self.obs_height = self.obs_range[0]*2 + 1
         self.obs_width = self.obs_range[1]*2 + 1
         self._node2id = self.get_node_id(env_info.get('nodes', []))
+        # Social state kept in sync with the change log of the environment
+        self._social_state = None
+        self._social_version = None
 
         # self.obs_dict = {self._id: self.observation_space.sample()}
 
@@ -133,6 +136,29 @@ class State:
             adj_matrix[from_id, to_id] = 1
         return adj_matrix.T
 
+    def update_social_state(self, social_obs):
+        # Same as `social_state2adj(social_obs['global']['edges'])`, but patched with the changes
+        # since the previous observation instead of rebuilt when they follow on from it
+        changes = social_obs.get('changes')
+        if self._social_state is None or changes is None or changes['since'] != self._social_version:
+            self._social_state = self.social_state2adj(social_obs['global']['edges'])
+        else:
+            for edge in changes['edges_removed']:
+                self._social_state[self._edge_node_ids(edge)] = 0
+            for edge in changes['edges_updated']:
+                self._social_state[self._edge_node_ids(edge)] = 1
+        self._social_version = social_obs['global'].get('version')
+        return self._social_state.copy()
+
+    def _edge_node_ids(self, edge):
+        # (to_id, from_id), as indexed in the transposed adjacency matrix
+        from_node = edge['from']
+        to_node = edge['to']
+        return (
+            self._node2id[f'{to_node["type"]}_{to_node["id"]}'],
+            self._node2id[f'{from_node["type"]}_{from_node["id"]}'],
+        )
+
     def social_state2nx(self, edge_list):
         G = nx.DiGraph()
         for edge in edge_list:
@@ -176,25 +202,37 @@ class State:
         update_obs['grid_observation'] = np.concatenate((player_layer, block_layer, event_layer, resource_layer),axis = 0)
         update_obs['inventory'] = self.inventory_toarray(obs['Player']['inventory'])
         update_obs['communication'] = self.words_toarray(obs['Social']['communications'])
-        update_obs['social_state'] = self.social_state2adj(obs['Social']['global']['edges'])
+        update_obs['social_state'] = self.update_social_state(obs['Social'])
         update_obs['time'] = np.array([obs['step_id']])
         return update_obs
 
     # If considering observation sharing, call this function before process_obs
     def sharing_obs(self, obs):
+        # Union of the own and shared map items, by hashed keys instead of list membership.
+        # The shared views are the ones of the sharing players themselves: a new observation is
+        # returned and neither of them is changed.
         shared_block = []
         shared_player = []
+        merged = {key: list(obs['Map'][key]) for key in ('resources', 'events', 'players')}
+        seen = {key: set(map(item_key, items)) for key, items in merged.items()}
         for player_id in obs['Social']['sharings']:
-            shared_map_info = obs['Social']['sharings'][player_id]['Map']  
-            for res in shared_map_info['resources']:
-                if res not in obs['Map']['resources']:
-                    obs['Map']['resources'].append(res)
-            for eve in shared_map_info['events']:
-                if eve not in obs['Map']['events']:
-                    obs['Map']['events'].append(eve)
-            for ply in shared_map_info['players']:
-                if ply not in obs['Map']['players']:
-                    obs['Map']['players'].append(ply)
+            shared_map_info = obs['Social']['sharings'][player_id]['Map']
+            for key, items in merged.items():
+                for item in shared_map_info[key]:
+                    _key = item_key(item)
+                    if _key not in seen[key]:
+                        seen[key].add(_key)
+                        items.append(item)
             shared_block.append(shared_map_info['block_grids'])
             shared_player.append(player_id)
+        obs = {**obs, 'Map': {**obs['Map'], **merged}}
         return obs, shared_player, np.asarray(shared_block)
+
+
+def item_key(item):
+    # Hashable key of a JSON-style map item, equal for equal items
+    if isinstance(item, dict):
+        return tuple(sorted((k, item_key(v)) for k, v in item.items()))
+    if isinstance(item, (list, tuple)):
+        return tuple(item_key(v) for v in item)
+    return item
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Integer codes of the physical actions. Codes from PICK_BY_NAME on take the id of a resource
+# (its index in `resource_names`) as argument, the others take none.
+NO_ACT = 0
+MOVE_UP = 1
+MOVE_DOWN = 2
+MOVE_LEFT = 3
+MOVE_RIGHT = 4
+PRODUCE = 5
+PICK_BY_NAME = 6
+DUMP_BY_NAME = 7
+
+ACTION_CODES = {
+    'no_act': NO_ACT,
+    'move_up': MOVE_UP,
+    'move_down': MOVE_DOWN,
+    'move_left': MOVE_LEFT,
+    'move_right': MOVE_RIGHT,
+    'produce': PRODUCE,
+    'pick_by_name': PICK_BY_NAME,
+    'dump_by_name': DUMP_BY_NAME,
+}
+# Names of the actions on the physical world, ignored while it is frozen (see `Game.frozen_steps`)
+PHYSICAL_ACTIONS = frozenset(['move', 'pick', *ACTION_CODES])
+# (dx, dy) of each action code, same as `Player._act_move_*`
+MOVE_DELTAS = np.array([
+    [0, 0],
+    [-1, 0],
+    [1, 0],
+    [0, -1],
+    [0, 1],
+    [0, 0],
+    [0, 0],
+    [0, 0],
+])
+
+
+def encode_action(action, resource2id):
+    # An action as taken by `Player.update` -> (code, arg). Only a single physical action per
+    # player and step can be encoded.
+    if isinstance(action, list):
+        if len(action) == 0:
+            return NO_ACT, 0
+        if len(action) > 1:
+            raise ValueError('Only a single action per player and step can be encoded')
+        action = action[0]
+    if isinstance(action, str):
+        _action = action
+        kwargs = {}
+    elif isinstance(action, dict):
+        _action = action['action']
+        kwargs = action.get('kwargs', {})
+    else:
+        _action, kwargs = action
+    if _action not in ACTION_CODES:
+        raise ValueError(f'Action `{_action}` has no integer code')
+    arg = resource2id[kwargs['resource_name']] if 'resource_name' in kwargs else 0
+    return ACTION_CODES[_action], arg
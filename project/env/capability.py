@@ -0,0 +1,58 @@
+import numpy as np
+
+# Threshold of requirements on unknown resources, which no inventory meets
+UNMET = np.iinfo(np.int64).max
+
+
+class Capabilities:
+    # Requirements {resource_name: n, ...} compiled into bitmasks. Every distinct condition
+    # "at least max(n, 1) of a resource" gets a bit (as `Player.check_amount`). The capability
+    # bitmask of an inventory holds the bits of the conditions it meets, and a requirement is
+    # met if its mask has no bit outside of the capabilities.
+    # Masks are little-endian uint8 arrays of `nbytes` bytes, so any number of conditions fits.
+    def __init__(self, resource_names):
+        self._resource2id = {name: i for i, name in enumerate(resource_names)}
+        self._bits = {}  # (resource_id, threshold) -> bit
+        self.resource_ids = np.zeros(0, dtype=np.int64)
+        self.thresholds = np.zeros(0, dtype=np.int64)
+
+    @property
+    def version(self):
+        # Masks and capabilities of different versions do not match
+        return len(self._bits)
+
+    @property
+    def nbytes(self):
+        return max(1, (len(self._bits) + 7) // 8)
+
+    def requirement_bits(self, requirements):
+        bits = []
+        for name, n in requirements.items():
+            resource_id = self._resource2id.get(name)
+            key = (0, UNMET) if resource_id is None else (resource_id, max(n, 1))
+            if key not in self._bits:
+                self._bits[key] = len(self._bits)
+                self.resource_ids = np.append(self.resource_ids, key[0])
+                self.thresholds = np.append(self.thresholds, key[1])
+            bits.append(self._bits[key])
+        return bits
+
+    def compile(self, requirements_list):
+        # (len(requirements_list), nbytes) requirement masks
+        bits_list = [self.requirement_bits(requirements) for requirements in requirements_list]
+        masks = np.zeros((len(bits_list), self.nbytes * 8), dtype=bool)
+        for i, bits in enumerate(bits_list):
+            masks[i, bits] = True
+        return np.packbits(masks, axis=1, bitorder='little')
+
+    def of(self, inventory):
+        # Capability bitmask of `inventory` (resource amounts in the order of `resource_names`)
+        held = np.zeros(self.nbytes * 8, dtype=bool)
+        held[:len(self._bits)] = inventory[self.resource_ids] >= self.thresholds
+        return np.packbits(held, bitorder='little')
+
+    @staticmethod
+    def check(masks, capabilities):
+        # Whether each requirement of `masks` is met. Masks compiled before later conditions
+        # were added are narrower, and bits never move, so only their bytes are compared.
+        return ~np.any(masks & ~capabilities[..., :masks.shape[-1]], axis=-1)
@@ -0,0 +1,41 @@
+def strongly_connected(successors):
+    # Strongly connected components of the graph {node: [(successor, data), ...]}, as lists of
+    # nodes in the order they were reached (Tarjan's algorithm, without recursion)
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for start in successors:
+        if start in index:
+            continue
+        index[start] = low[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        path = [(start, iter(successors[start]))]
+        while path:
+            u, edges = path[-1]
+            for v, _ in edges:
+                if v not in index:
+                    index[v] = low[v] = len(index)
+                    stack.append(v)
+                    on_stack.add(v)
+                    path.append((v, iter(successors.get(v, ()))))
+                    break
+                if v in on_stack:
+                    low[u] = min(low[u], index[v])
+            else:
+                path.pop()
+                if path:
+                    w = path[-1][0]
+                    low[w] = min(low[w], low[u])
+                if low[u] == index[u]:
+                    component = []
+                    while True:
+                        v = stack.pop()
+                        on_stack.discard(v)
+                        component.append(v)
+                        if v is u:
+                            break
+                    components.append(sorted(component, key=index.get))
+    return components
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def resolve_collisions(cells, next_cells, moved, occupancy, rng):
+    # Same rules as the original `Game.collision_check`: a move is undone if it runs into
+    # a player that stays, or loses a random draw against other players moving into the
+    # same cell. Undone players stay, which may undo further moves, so undo chains are
+    # followed iteratively instead of recursively.
+    # `cells` / `next_cells`: flat cell index of each player now / after its move
+    # `moved`: players that move, with moves into blocks already removed
+    # `occupancy`: all-False bool buffer over the flat cells, left all-False on return
+    moved = moved.copy()
+    occupancy[cells[~moved]] = True
+    while True:
+        undone = moved & occupancy[next_cells]
+        if undone.any():
+            moved &= ~undone
+            occupancy[cells[undone]] = True
+            continue
+        # Random tie-breaking among players moving into the same cell
+        movers = np.flatnonzero(moved)
+        targets = next_cells[movers]
+        order = np.lexsort((rng.random(len(movers)), targets))
+        targets = targets[order]
+        losers = movers[order][:-1][targets[:-1] == targets[1:]]
+        if len(losers) == 0:
+            break
+        moved[losers] = False
+        occupancy[cells[losers]] = True
+    occupancy[cells] = False
+    return moved
@@ -8,6 +8,8 @@ from .gui.canvas import Canvas
 from .gui.render import Render
 from ..utils.config_loader import ConfigLoader
 from ..utils.game_editor import GameEditor
+from ..utils.layout_pool import LayoutPool
+from ..utils.map_store import get_map_store
 import random
 
 
@@ -15,10 +17,31 @@ class Environment(MultiAgentEnv):
     def __init__(
         self,
         config_name='./config/main.json',
+        obs_mode='dict',
+        grid_view='fov',
+        layout_pool_size=0,
+        freeze_physics=False,
+        map_cache_dir=None,
     ):
+        # `obs_mode`: `dict` for JSON-style observations (default, all agents), `tensor` for the
+        # arrays of the RL task agents, whose grid observation is either `fov` or `map` sized.
+        # Both are the arrays the agents build from the dict observations.
+        self.obs_mode = obs_mode
+        self.grid_view = grid_view
         self.config_loader = ConfigLoader(config_name)
-        self.game_editor = GameEditor(config=self.config_loader.config)
+        # `map_cache_dir`: share the map files of the tasks between environments and processes
+        # through memory-mapped copies in this directory (see `MapStore`, whose `clear` removes
+        # them). By default every game loads its own copy.
+        map_store = get_map_store(map_cache_dir) if map_cache_dir is not None else None
+        self.game_editor = GameEditor(config=self.config_loader.config, map_store=map_store)
+        # `layout_pool_size` > 0: draw the placements of upcoming episodes in the background
+        self.layout_pool = LayoutPool(self.game_editor, size=layout_pool_size) if layout_pool_size > 0 else None
+        # `freeze_physics`: only social actions are processed during the negotiation / contract
+        # phase, whose physical actions are masked anyway
+        self.freeze_physics = freeze_physics
         self.episode = -1
+        self.game = None
+        self._infos = None
 
         # Render
         render_config = self.config_loader.render
@@ -35,24 +58,43 @@ class Environment(MultiAgentEnv):
         self.episode += 1
         self.step_num = 0
 
-        self.game = self.game_editor.generate_game()
-        obs = self.game.observations
+        if self.game is None:
+            self.game = self.game_editor.generate_game(
+                obs_mode=self.obs_mode, grid_view=self.grid_view, seed=seed, freeze_physics=self.freeze_physics
+            )
+        else:
+            # Same config: reuse the game and only draw its placements again
+            layout = self.layout_pool.get() if self.layout_pool is not None else None
+            self.game_editor.reset_game(self.game, seed=seed, layout=layout)
+        obs = self.game.observations.to_dict()
+        random_seed = random.randint(0, 2**32-1)
+        if self._infos is None:
+            self._infos = self._get_infos()
+        infos = {name: {
+            **info,
+            'episode_id': self.episode,
+            'step_id': self.step_num,
+            'seed': random_seed,
+        } for name, info in self._infos.items()}
+
+        self.rendering.load_game(self.game)
+
+        return obs, infos
+
+    def _get_infos(self):
+        # Per-player infos that stay the same over the episodes of the config
         events = self.config_loader.config['event']
-        resource_name_list = [resource.name for resource in self.game.resources]
-        event_in_name_list = sum([list(events[e.name]['in'].keys()) for e in self.game.events],[])
-        event_out_name_list = sum([list(events[e.name]['out'].keys()) for e in self.game.events],[])
-        resource_name = list(set(resource_name_list + event_in_name_list + event_out_name_list))
+        resource_name = self.game.resource_names
         node_list = self.game.social.get_node_list()
         player_num = len(self.game.players)
         group_num = len(self.game.social.group_dict)
-        random_seed = random.randint(0, 2**32-1)
         
-        infos = {player.name: {
+        return {player.name: {
             'episode_id': self.episode,
             'step_id': self.step_num,
             'max_length': self.game.max_length,
             'map_size': self.game.world_map.shape,
-            'seed': random_seed,
+            'seed': None,  # per episode
             'group_num': group_num,
             'player_num': player_num,
             '_id': player._id,
@@ -74,19 +116,25 @@ class Environment(MultiAgentEnv):
             "claim_proposal_interval":self.config_loader.config.task.negotiation.get('claim_proposal_interval', 0),
         } for player in self.game.players}
 
-        self.rendering.load_game(self.game)
-
-        return obs, infos
-
     def step(
         self,
         action_dict,
+        obs_agents=None,
     ):
+        # `obs_agents`: names of the players to observe this step (all by default). The
+        # observations of the others are not built.
         self.game.pre_update()
-        self.game.update(action_dict)
+        if isinstance(action_dict, tuple):
+            # Integer-coded actions of all players: (codes, args), see `Game.encode_actions`
+            self.game.update_coded(*action_dict)
+        else:
+            self.game.update(action_dict)
         self.rendering.render_frame()
         self.game.post_update()
-        next_obs = self.game.observations
+        if obs_agents is None:
+            next_obs = self.game.observations.to_dict()
+        else:
+            next_obs = self.game.observations.subset(obs_agents)
         rewards = self.game.rewards
         terminateds = self.game.terminateds
         # TODO Add an agent callback func
@@ -110,4 +158,8 @@ class Environment(MultiAgentEnv):
     def save_video(self):
         self.rendering.save_video()
 
+    def close(self):
+        if self.layout_pool is not None:
+            self.layout_pool.close()
+
 
@@ -5,7 +5,6 @@ class Event:
         position,
         inputs,
         outputs,
-        resource_pool,
         requirements={},
         avail_interval=0,
     ):
@@ -13,20 +12,15 @@ class Event:
         self.x, self.y = position
         self.inputs = inputs
         self.outputs = outputs
-        self.resource_pool = resource_pool
         self.requirements = requirements
         self.avail_interval = avail_interval
-        self.cooldown = 0
-        
-    def update(self):
-        if self.cooldown > 0:
-            self.cooldown -= 1
+        # Cooldowns are kept by the `EventScheduler` of the game, which sets these on load
+        self.scheduler = None
+        self.index = None
 
     def provide(self):
-        resources = []
-        for name, num in self.outputs.items():
-            resources.append(self.resource_pool[name].provide(num))
-        return resources
+        # (resource_name, amount) pairs of the outputs
+        return list(self.outputs.items())
 
     def check_visible(self, player):
         for name, num in self.requirements.items():
@@ -44,6 +38,10 @@ class Event:
     def position(self):
         return (self.x, self.y)
 
+    @property
+    def cooldown(self):
+        return self.scheduler.cooldown(self) if self.scheduler else 0
+
     @property
     def is_available(self):
-        return self.cooldown == 0
+        return bool(self.scheduler.available[self.index]) if self.scheduler else True
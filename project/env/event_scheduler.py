@@ -0,0 +1,73 @@
+import heapq
+
+import numpy as np
+
+
+class EventScheduler:
+    # Cooldowns of events, kept as the step at which each event is ready again. Pending events sit
+    # on a heap keyed by that step, so an event is re-enabled once when its cooldown expires
+    # instead of being counted down every step.
+    # `available` (in the order of `events`) and `available_map` (by cell) hold the availability.
+    def __init__(self, size_x, size_y):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.steps = 0
+        self.events = []
+        self.ready_steps = np.zeros(0, dtype=np.int64)
+        self.available = np.zeros(0, dtype=bool)
+        self.available_map = np.zeros((size_x, size_y), dtype=bool)
+        self._heap = []  # (ready step, event index), may hold entries superseded by a later start
+
+    def load(self, events):
+        # All `events` available, at their current positions
+        self.events = list(events)
+        for i, event in enumerate(self.events):
+            event.scheduler = self
+            event.index = i
+        self.ready_steps = np.zeros(len(self.events), dtype=np.int64)
+        self._heap = []
+        self._update_availability()
+
+    def advance(self, steps):
+        # Re-enable the events whose cooldown expired by `steps`
+        self.steps = steps
+        while self._heap and self._heap[0][0] <= steps:
+            ready_step, i = heapq.heappop(self._heap)
+            if self.ready_steps[i] == ready_step:
+                self.available[i] = True
+                self.available_map[self.events[i].position] = True
+
+    def start(self, event, interval=None):
+        # Cool `event` down for `interval` steps (its `avail_interval` by default)
+        if interval is None:
+            interval = event.avail_interval
+        if interval <= 0:
+            return
+        ready_step = self.steps + interval
+        self.ready_steps[event.index] = ready_step
+        self.available[event.index] = False
+        self.available_map[event.position] = False
+        heapq.heappush(self._heap, (ready_step, event.index))
+
+    def cooldown(self, event):
+        return max(0, int(self.ready_steps[event.index]) - self.steps)
+
+    def snapshot(self):
+        return {
+            'steps': self.steps,
+            'ready_steps': self.ready_steps.copy(),
+        }
+
+    def restore(self, state):
+        self.steps = state['steps']
+        self.ready_steps = state['ready_steps'].copy()
+        self._heap = [(int(ready_step), i) for i, ready_step in enumerate(self.ready_steps) if ready_step > self.steps]
+        heapq.heapify(self._heap)
+        self._update_availability()
+
+    def _update_availability(self):
+        self.available = self.ready_steps <= self.steps
+        self.available_map[:] = False
+        for event, available in zip(self.events, self.available):
+            if available:
+                self.available_map[event.position] = True
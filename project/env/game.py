@@ -1,8 +1,28 @@
-import random
-import networkx as nx
 import numpy as np
 import json
+from operator import attrgetter
 from ..utils.json_encoder import NumpyEncoder
+from .action_codes import encode_action
+from .capability import Capabilities
+from .coalition import strongly_connected
+from .collision import resolve_collisions
+from .event_scheduler import EventScheduler
+from .grid_layers import GridLayers
+from .observations import Observations
+from .spatial_index import SpatialIndex
+
+
+def preprocess_obs(obs):
+    # JSON-style copy of an observation: arrays and tuples as lists
+    if isinstance(obs, dict):
+        return {k: preprocess_obs(v) for k, v in obs.items()}
+    elif isinstance(obs, list):
+        return [preprocess_obs(item) for item in obs]
+    elif isinstance(obs, np.ndarray):
+        return obs.tolist()
+    elif isinstance(obs, tuple):
+        return list(obs)
+    return obs
 
 
 class Game:
@@ -10,6 +30,7 @@ class Game:
         self,
         world_map,
         resources,
+        resource_grid,
         events,
         players,
         social,
@@ -17,19 +38,25 @@ class Game:
         negotiation_steps,
         pre_updates,
         post_updates,
-        max_length
+        max_length,
+        communication_length=0,
+        obs_mode='dict',
+        grid_view='fov',
+        seed=None,
+        frozen_steps=0,
     ):
         # Map
         self.world_map = world_map
         # Resource
-        self.resource_dict = {}
+        self.resource_grid = resource_grid
         self.resources = resources
         for resource in resources:
-            self.lay_resource(resource)
+            self.lay_resource(resource.position, resource.name, resource.amount)
         # Players {'player_id': Player(), ...}
         self.players = players
         self.player_dict = {player._id: player for player in players}
         self.player_name2id = {player.name: player._id for player in players}
+        self.spatial_index = SpatialIndex(*world_map.shape)
         self.update_position_dict()
         for player in self.players:
             player.join_game(self)
@@ -39,19 +66,46 @@ class Game:
         self.social_schedule = social_schedule
         self.milestones = sorted([int(key) for key in social_schedule.keys()])
         self.negotiation_steps = negotiation_steps
+        # The physical world is frozen during the first `frozen_steps` steps (e.g. negotiation
+        # phases): only social actions and social updates are processed then
+        self.frozen_steps = frozen_steps
         # Events
         self.events = events
         self.event_dict = {tuple(event.position): event for event in events}
+        self.event_scheduler = EventScheduler(*world_map.shape)
+        self.event_scheduler.load(events)
+        # Global observation layers
+        self.grid_layers = GridLayers(world_map, resource_grid, events)
+        self.grid_layers.load_players(self.players)
+        # Collision: seeded tie-breaking and a flat (size_x * size_y) occupancy buffer
+        self.rng = np.random.default_rng(seed)
+        self._occupancy = np.zeros(world_map.size_x * world_map.size_y, dtype=bool)
 
         self.steps = 0
         self.episodes = 0
         self.max_length = max_length
         # Observations
+        # `dict`: JSON-style nested dicts, `tensor`: the arrays the task agents declare
+        # `grid_view` (tensor mode only): `fov` crops or map-sized `map` crops with sharing
+        self.resource_names = self._get_resource_names()
+        self._resource2id = {name: i for i, name in enumerate(self.resource_grid.resource_names)}
+        self.communication_length = communication_length
+        self.obs_mode = obs_mode
+        self.grid_view = grid_view
+        self._obs_resource_ids = [self.resource_grid.resource_id(name) for name in self.resource_names]
+        self._capacities = np.array([
+            [player.resource_max_dict.get(name, 0) for name in self.resource_names] for player in self.players
+        ], dtype=np.int64).reshape(self.player_num, len(self.resource_names))
+        self._social_version = None
+        self._frozen_views = {}
+        self._obs = None
         self._obs = self._get_obs()
-        # Rewards
+        # Rewards: per-step reward of each player, in the order of `players`
+        self.reward_vector = np.zeros(self.player_num, dtype=np.float64)
         self.rewards = self._get_rewards()
         # Terminateds
         self.terminated = False
+        self.terminateds = {}
 
         self._pre_update_funcs = {
             'symmetrize_relation': self._post_symmetrize_relation,
@@ -78,6 +132,8 @@ class Game:
         }
         self.social_pre_update = self.load_func(pre_updates, self._pre_update_funcs)
         self.social_post_update = self.load_func(post_updates, self._post_update_funcs)
+        # Start of the episode, restored by `reset`
+        self._initial_state = self.snapshot()
 
     @property
     def observations(self):
@@ -88,10 +144,17 @@ class Game:
             player.pre_update()
         self.social_pre_update()
 
+    @property
+    def world_frozen(self):
+        return self.steps < self.frozen_steps
+
     def update(self, action_dict):
-        # Events
-        for event in self.event_dict.values():
-            event.update()
+        if self.world_frozen:
+            for player_name, action in action_dict.items():
+                self.player_dict[self.player_name2id[player_name]].update(action, social_only=True)
+            return
+        # Events: re-enable the ones whose cooldown expired
+        self.event_scheduler.advance(self.steps)
         # Players: update
         for player_name, action in action_dict.items():
             player_id = self.player_name2id[player_name]
@@ -99,13 +162,40 @@ class Game:
             player.update(action)
         # Collision
         self.collision_check()
-        self.update_position_dict()
+
+    def encode_actions(self, action_dict):
+        # {player_name: action, ...} -> (codes, args) in the order of `players`, for `update_coded`
+        codes = np.zeros(self.player_num, dtype=np.int64)
+        args = np.zeros(self.player_num, dtype=np.int64)
+        for player_name, action in action_dict.items():
+            player_id = self.player_name2id[player_name]
+            codes[player_id], args[player_id] = encode_action(action, self._resource2id)
+        return codes, args
+
+    def update_coded(self, codes, args=None):
+        # `update` with integer-coded physical actions of all players (see `action_codes`),
+        # (player_num,) arrays in the order of `players`
+        if self.world_frozen:
+            return
+        self.event_scheduler.advance(self.steps)
+        codes = np.asarray(codes).tolist()
+        args = [0] * len(codes) if args is None else np.asarray(args).tolist()
+        for player, code, arg in zip(self.players, codes, args):
+            if code:
+                player.update_coded(code, arg)
+        self.collision_check()
 
     def post_update(self):
         # Players: post update
-        for player in self.players:
+        frozen = self.world_frozen
+        prev_positions = [player.position for player in self.players]
+        for i, player in enumerate(self.players):
             player.post_update()
-        self.update_position_dict()
+            self.reward_vector[i] = player.reward
+        if not frozen:
+            self.spatial_index.move_players(prev_positions, self.players)
+            self.grid_layers.move_players(prev_positions, self.players)
+            self._frozen_views = {}
         # Time
         self.steps += 1
         # Social
@@ -119,224 +209,276 @@ class Game:
         # Terminateds
         self.terminateds = self._get_terminateds()
 
-    def bubble_up_resource(self, position, resource_name):
-        resource = self.resource_dict.get(tuple(position))
-        if resource:
-            top_resource = resource
-            if resource.name == resource_name:
-                return resource
-            next_resource = resource.stacked_resource
-            while next_resource:
-                if next_resource.name == resource_name:
-                    resource.stacked_resource = next_resource.stacked_resource
-                    next_resource.stacked_resource = top_resource
-                    self.resource_dict[tuple(position)] = next_resource
-                    return next_resource
-                resource = next_resource
-                next_resource = resource.stacked_resource
-        return None
-
-    def provide_resource(self, position, require_num=1):
-        resource = self.resource_dict.get(tuple(position))
-        if resource:
-            obtained_resource = resource.provide(require_num)
-            
-            if not resource.is_available:
-                if resource.stacked_resource:
-                    self.resource_dict[tuple(position)] = resource.stacked_resource
-                else:
-                    del self.resource_dict[tuple(position)]
-            return obtained_resource
-        return None
+    def snapshot(self):
+        # Full simulation state, to be put back by `restore` (e.g. for lookahead or rollback)
+        return {
+            'steps': self.steps,
+            'episodes': self.episodes,
+            'terminated': self.terminated,
+            'milestones': list(self.milestones),
+            'rng': self.rng.bit_generator.state,
+            'resources': self.resource_grid.snapshot(),
+            'players': [player.snapshot() for player in self.players],
+            'events': self.event_scheduler.snapshot(),
+            'social': self.social.snapshot(),
+            'reward_vector': self.reward_vector.copy(),
+            'rewards': self.rewards,
+            'terminateds': self.terminateds,
+        }
 
-    def lay_resource(self, resource):
-        position = tuple(resource.position) if isinstance(resource.position, list) else resource.position
-        if position in self.resource_dict:
-            resource.stacked_resource = self.resource_dict[position]
-        self.resource_dict[position] = resource
+    def restore(self, state):
+        self.steps = state['steps']
+        self.episodes = state['episodes']
+        self.terminated = state['terminated']
+        self.milestones = list(state['milestones'])
+        self.rng.bit_generator.state = state['rng']
+        self.resource_grid.restore(state['resources'])
+        for player, player_state in zip(self.players, state['players']):
+            player.restore(player_state)
+        self.event_scheduler.restore(state['events'])
+        self.social.restore(state['social'])
+        self.update_position_dict()
+        self.grid_layers.load_players(self.players)
+        self.reward_vector[:] = state['reward_vector']
+        self.rewards = state['rewards']
+        self.terminateds = state['terminateds']
+        # The observation carries no social changes, so observers take the full lists
+        self._social_version = None
+        self._frozen_views = {}
+        self._obs = self._get_obs()
+
+    def reset(self, resource_placements, event_positions, player_positions, seed=None):
+        # New episode in place: the initial state, with the resources, events and players moved to
+        # new positions. The blocks of `world_map` are expected to be drawn again beforehand.
+        self.restore(self._initial_state)
+        self.rng = np.random.default_rng(seed)
+        self.grid_layers.load_blocks(self.world_map)
+        # Resources: [(position, amount), ...] in the order of `resources`
+        self.resource_grid.clear()
+        for resource, (position, amount) in zip(self.resources, resource_placements):
+            resource.set_position(position)
+            resource.amount = amount
+            self.lay_resource(position, resource.name, amount)
+        # Events
+        for event, position in zip(self.events, event_positions):
+            event.x, event.y = position
+        self.event_dict = {tuple(event.position): event for event in self.events}
+        self.event_scheduler.load(self.events)
+        self.grid_layers.load_events(self.events)
+        # Players
+        for player, position in zip(self.players, player_positions):
+            player.set_position(position)
+        self.update_position_dict()
+        self.grid_layers.load_players(self.players)
+        self._social_version = None
+        self._frozen_views = {}
+        self._obs = self._get_obs()
+        self.rewards = self._get_rewards()
+
+    def provide_resource(self, position, resource_name, require_num=1):
+        return self.resource_grid.provide(position, resource_name, require_num)
+
+    def lay_resource(self, position, resource_name, amount):
+        self.resource_grid.lay(position, resource_name, amount)
+
+    def get_grid_observations(self, players=None, resource_ids=None):
+        if players is None:
+            players = self.players
+        return self.grid_layers.crop(players, resource_ids)
 
     def get_event(self, position):
         return self.event_dict.get(tuple(position), None)
 
+    def event_availability(self):
+        # (size_x, size_y) map of the cells holding an available event
+        return self.event_scheduler.available_map
+
     def grid_map(self, position, fov):
-        x, y = position
-        h, v = fov
-        return self.world_map.grids(x - h, x + h + 1, y - v, y + v + 1)
+        return self.world_map.window(position, fov)
+
+    def grid_maps(self, players):
+        # {player.name: block window} for all `players`, in one gather per FOV shape
+        fov_groups = {}
+        for player in players:
+            fov_groups.setdefault(tuple(player.fov), []).append(player)
+        windows = {}
+        for fov, group in fov_groups.items():
+            group_windows = self.world_map.windows([player.position for player in group], fov)
+            windows.update(zip([player.name for player in group], group_windows))
+        return windows
 
     def collision_check(self):
-        blocked_positions = set()
-        collided_position_dict = {}
-        for player in self.players:
-            pos = player.next_scolled_position
-            # Map blocks
-            if self.world_map.is_block(pos):
+        size_y = self.world_map.size_y
+        positions = np.array([player.position for player in self.players]).reshape(-1, 2)
+        next_positions = np.array([player.next_scolled_position for player in self.players]).reshape(-1, 2)
+        cells = positions[:, 0] * size_y + positions[:, 1]
+        next_cells = next_positions[:, 0] * size_y + next_positions[:, 1]
+        # Map blocks
+        moved = np.array([player.is_moved for player in self.players], dtype=bool)
+        moved &= self.grid_layers.block_layer[next_positions[:, 0], next_positions[:, 1]] == 0
+        # Player collision
+        moved = resolve_collisions(cells, next_cells, moved, self._occupancy, self.rng)
+        for player, is_moved in zip(self.players, moved):
+            if player.is_moved and not is_moved:
                 player.undo_action()
-                pos = player.next_scolled_position
-            # Player collision
-            if player.is_moved:
-                if pos in blocked_positions:
-                    player.undo_action()
-                    pos = player.next_scolled_position
-                    blocked_positions.add(pos)
-                    self.__undo_collided_players(pos, blocked_positions, collided_position_dict)
-                else:
-                    if pos in collided_position_dict:
-                        collided_position_dict[pos].append(player)
-                    else:
-                        collided_position_dict[pos] = [player]
-            else:
-                blocked_positions.add(pos)
-                self.__undo_collided_players(pos, blocked_positions, collided_position_dict)
-        for collided_position in list(collided_position_dict):
-            players = collided_position_dict.get(collided_position)
-            if players:
-                random.shuffle(players)
-                collided_position_dict[collided_position] = [players.pop()]
-                for player in players:
-                    player.undo_action()
-                    pos = player.next_scolled_position
-                    blocked_positions.add(pos)
-                    self.__undo_collided_players(pos, blocked_positions, collided_position_dict)
 
     def update_position_dict(self):
-        self.player_position = {tuple(player.position): player for player in self.players}
+        self.spatial_index.load(self.players)
+
+    def get_player(self, position):
+        return self.spatial_index.get(position)
         
     def _post_update_matching_edge(self, condition_attr, result_attr1, result_attr2):
-        graph = self.social.social_graph
+        social = self.social
         matched_list = []
-        for u, v, attr in graph.edges(data=True):
+        for u, v, attr in social.relations(condition_attr):
             if condition_attr in attr:
-                if graph.has_edge(v,u) and graph[v][u].get(condition_attr) is not None:
-                    edge1_condition = graph[u][v].get(condition_attr)
-                    edge2_condition = graph[v][u].get(condition_attr)
+                if social.has_relation(v, u) and social.get_relation(v, u).get(condition_attr) is not None:
+                    edge1_condition = attr.get(condition_attr)
+                    edge2_condition = social.get_relation(v, u).get(condition_attr)
                     if edge1_condition == edge2_condition:
-                        graph.edges[u, v].pop(condition_attr)
-                        graph.edges[v, u].pop(condition_attr)
-                        self.social.add_relation(u, v, **result_attr1)
-                        self.social.add_relation(v, u, **result_attr2)
+                        # Add the results first so that the edges survive dropping the condition
+                        social.add_relation(u, v, **result_attr1)
+                        social.add_relation(v, u, **result_attr2)
+                        social.remove_relation(u, v, condition_attr)
+                        social.remove_relation(v, u, condition_attr)
                         matched_list.append((u,v))
         return matched_list
 
     def _post_merge_group(self, group1, group2):
-        social_graph = self.social
-        common_members = set(social_graph.successors(group1)) & set(social_graph.successors(group2))
+        social = self.social
+        common_members = set(social.successors(group1)) & set(social.successors(group2))
 
         for member in common_members:
-            attrs_group1 = social_graph[group1][member]
-            attrs_group2 = social_graph[group2][member]
+            attrs_group1 = social.get_relation(group1, member)
+            attrs_group2 = social.get_relation(group2, member)
             if attrs_group1 != attrs_group2:
                 print(f"Cannot merge {group1} and {group2}. Conflict on member {member}.")
                 return False
 
-        for member in social_graph.successors(group2):
-            if not social_graph.has_edge(group1, member):
-                self.social.join_group(member, group1, **social_graph[group2][member])
+        for member in social.successors(group2):
+            if not social.has_relation(group1, member):
+                self.social.join_group(member, group1, **social.get_relation(group2, member))
         self.social.remove_group(group2)
         # print(f"{group1} and {group2} successfully merged.")
         return True
 
     def _post_update_relation_to_group(self, condition_attr, result_attr):
-        edges_to_remove = []
-        for u, v, data in self.social.social_graph.edges(data=True):
-            if data.get('attribute') == condition_attr:
-                edges_to_remove.append((u, v))
-
-        subgraph = self.social.social_graph.edge_subgraph(edges_to_remove).copy()
-        scc_list = list(nx.strongly_connected_components(subgraph))
-        scc_subgraphs = [subgraph.subgraph(scc).copy() for scc in scc_list]
-
-        for subgraph in scc_subgraphs:
-            edges_to_remove = list(subgraph.edges())
-            self.social.social_graph.remove_edges_from(edges_to_remove)
-            group_node = self.social.create_group()
-            nodes_in_edges = set([u for u, v in edges_to_remove] + [v for u, v in edges_to_remove])
-            for node in nodes_in_edges:
-                self.social.join_group(node, group_node, **{result_attr: self.social.social_graph[node][group_node][condition_attr]})
+        # Players on a cycle of relations tagged `attribute: condition_attr` form a new group,
+        # one per strongly connected component. Only the tagged edges are visited.
+        social = self.social
+        successors = {}
+        for u, v, data in social.relations('attribute'):
+            if data['attribute'] == condition_attr:
+                successors.setdefault(u, []).append((v, data))
+        for component in strongly_connected(successors):
+            members = set(component)
+            edges = [
+                (u, v, data) for u in component for v, data in successors.get(u, ())
+                if v in members
+            ]
+            if not edges:
+                continue
+            values = {}
+            for u, v, data in edges:
+                values.setdefault(u, data.get(condition_attr))
+            for u, v, data in edges:
+                for attr in list(data):
+                    social.remove_relation(u, v, attr)
+            group_node = social.create_group()
+            for node in component:
+                social.join_group(node, group_node, **{result_attr: values[node]})
 
     def _post_update_merge_relation_to_group(self, condition_attr, result_attr):
-        for node in self.players:
-            node_data = self.social.social_graph.nodes[node]
-            for _, other, edge_attr in list(self.social.social_graph.out_edges(node, data=True)):
-                other_data = self.social.social_graph.nodes[other]
-                if edge_attr.get(condition_attr) and other_data.get('type') == 'player':
-                    if self.social.social_graph.has_edge(other, node) and \
-                        self.social.social_graph[other][node].get(condition_attr):
-                            result_attr_value1 = edge_attr.get(condition_attr)
-                            result_attr_value2 = self.social.social_graph[other][node].get(condition_attr)
-                            self.social.remove_relation(node, other, condition_attr)
-                            self.social.remove_relation(other, node, condition_attr)
-                            if not node.groups and not other.groups:
-                                group = self.social.create_group()
-                                self.social.join_group(node, group, **{result_attr: result_attr_value1})
-                                self.social.join_group(other, group, **{result_attr: result_attr_value2})
-                            elif not node.groups:
-                                for group in other.groups:
-                                    if self.social.social_graph[group][other].get(result_attr):
-                                        self.social.join_group(node, group, **{result_attr: result_attr_value1})
-                            elif not other.groups:
-                                for group in node.groups:
-                                    if self.social.social_graph[group][node].get(result_attr):
-                                        self.social.join_group(other, group, **{result_attr: result_attr_value2})
-                            else: # merge group
-                                for other_group in other.groups.copy():
-                                    for member in list(self.social.social_graph.successors(other_group)):
-                                        for node_group in node.groups:
-                                            if not self.social.social_graph.has_edge(node_group, member):
-                                                self.social.join_group(member, node_group, **self.social.social_graph[other_group][member])
-                                                self.social.quit_group(member, other_group)
-                                    if other_group != node_group:
-                                        self.social.remove_group(other_group)
+        # Mutual `condition_attr` relations between players join them into one group: the one
+        # without a group joins the groups of the other, and if both have groups, the groups of
+        # `other` are merged into each group of `node`
+        social = self.social
+        for node, other, edge_attr in social.relations(condition_attr):
+            if not (edge_attr.get(condition_attr) and social.node_type(node) == 'player' and social.node_type(other) == 'player'):
+                continue
+            if not (social.has_relation(other, node) and social.get_relation(other, node).get(condition_attr)):
+                continue
+            result_attr_value1 = edge_attr.get(condition_attr)
+            result_attr_value2 = social.get_relation(other, node).get(condition_attr)
+            social.remove_relation(node, other, condition_attr)
+            social.remove_relation(other, node, condition_attr)
+            node_groups = sorted(node.groups, key=attrgetter('_id'))
+            other_groups = sorted(other.groups, key=attrgetter('_id'))
+            if not node_groups and not other_groups:
+                group = social.create_group()
+                social.join_group(node, group, **{result_attr: result_attr_value1})
+                social.join_group(other, group, **{result_attr: result_attr_value2})
+            elif not node_groups:
+                for group in other_groups:
+                    if social.get_relation(group, other).get(result_attr):
+                        social.join_group(node, group, **{result_attr: result_attr_value1})
+            elif not other_groups:
+                for group in node_groups:
+                    if social.get_relation(group, node).get(result_attr):
+                        social.join_group(other, group, **{result_attr: result_attr_value2})
+            else:
+                for other_group in other_groups:
+                    if other_group in node.groups:
+                        continue
+                    for member in list(other_group.players):
+                        attr = dict(social.get_relation(other_group, member))
+                        for node_group in node_groups:
+                            if not social.has_relation(node_group, member):
+                                social.join_group(member, node_group, **attr)
+                    social.remove_group(other_group)
+
     def _post_update_relation_switch(self, condition_attr, target_attr):
-        social_graph = self.social.social_graph
+        social = self.social
         
         edges_to_modify = []
-        for A, B, edge_data in social_graph.edges(data=True):
+        for A, B, edge_data in social.relations(condition_attr):
             if condition_attr in edge_data:
-                if social_graph.has_edge(B, A) and target_attr in social_graph[B][A]:
+                if social.has_relation(B, A) and target_attr in social.get_relation(B, A):
                     edges_to_modify.append((A, B, edge_data[condition_attr]))
         
         for A, B, value in edges_to_modify:
-            for attr in social_graph[A][B]:
+            for attr in list(social.get_relation(A, B)):
                 self.social.remove_relation(A, B, attr)
             self.social.add_relation(A, B, **{target_attr: value})
             
     def _post_symmetrize_relation(self, attr):
-        social_graph = self.social.social_graph
+        social = self.social
         edges_to_add = []
 
-        for u, v, data in social_graph.edges(data=True):
+        for u, v, data in social.relations(attr):
             if attr in data:
-                if not social_graph.has_edge(v, u):
+                if not social.has_relation(v, u):
                     edges_to_add.append((v, u, data[attr]))
                 else:
-                    if attr not in social_graph[v][u]:
-                        social_graph[v][u][attr] = data[attr]
+                    if attr not in social.get_relation(v, u):
+                        social.add_relation(v, u, **{attr: data[attr]})
         for v, u, value in edges_to_add:
             self.social.add_relation(v, u, **{attr: value})
             
     def _post_normalization(self, attr):
-        social_graph = self.social.social_graph
+        social = self.social
 
-        for group_node in social_graph.nodes:
-            if social_graph.nodes[group_node].get('type') == 'group':
+        for group_node in list(social.group_dict.values()):
+            if social.node_type(group_node) == 'group':
                 total_attr_value = 0.0
                 edges = []
-                for neighbor in social_graph.successors(group_node):
-                    if social_graph.nodes[neighbor].get('type') == 'player':
-                        if attr in social_graph[group_node][neighbor]:
-                            total_attr_value += social_graph[group_node][neighbor][attr]
+                for _, neighbor, data in social.out_relations(group_node):
+                    if social.node_type(neighbor) == 'player':
+                        if attr in data:
+                            total_attr_value += data[attr]
                             edges.append((group_node, neighbor))
 
                 if total_attr_value > 0:
                     for group_node, player_node in edges:
-                        social_graph[group_node][player_node][attr] /= total_attr_value
-                        self.social.update_edge_dict(group_node, player_node)
+                        value = social.get_relation(group_node, player_node)[attr]
+                        social.add_relation(group_node, player_node, **{attr: value / total_attr_value})
 
     def _post_clear_temporary_relation(self, attr):
-        social_graph = self.social.social_graph
+        social = self.social
         edge_list = []
-        for u, v, edge_data in social_graph.edges(data=True):
-            if attr in edge_data and social_graph.nodes[u]['type'] == 'player' and social_graph.nodes[v]['type'] == 'player':
+        for u, v, edge_data in social.relations(attr):
+            if attr in edge_data and social.node_type(u) == 'player' and social.node_type(v) == 'player':
                 edge_list.append((u, v, attr))
         for u, v, attr in edge_list:        
             self.social.remove_relation(u, v, attr)
@@ -373,29 +515,22 @@ class Game:
                 graph_info = self.social_schedule[str(milestone)]
                 self.social.load_graph(graph_info)
 
-    def __undo_collided_players(self, collided_position, blocked_positions, collided_position_dict):
-        players = collided_position_dict.pop(collided_position, [])
-        for player in players:
-            player.undo_action()
-            pos = player.next_scolled_position
-            blocked_positions.add(pos)
-            self.__undo_collided_players(pos, blocked_positions, collided_position_dict)
-
     def _post_update_split_score_to_group(self, attribute):
         shared_groups = set()
-        for player in self.players:
+        for i, player in enumerate(self.players):
             group_set = player.group_dict.get(attribute, {})
             # if a player has joined multiple groups with required attribute, his score is divided equally to each group
             if group_set:
-                base_score = player.reward / len(group_set)
+                base_score = float(self.reward_vector[i]) / len(group_set)
                 for group in group_set:
                     player.provide_score(base_score)
                     group.earn_score(base_score)
                     shared_groups.add(group)
         for group in shared_groups:
-            group.split_score(self.social.social_graph, attribute)
-        for player in self.players:
+            group.split_score(self.social, attribute)
+        for i, player in enumerate(self.players):
             player.settle_score()
+            self.reward_vector[i] = player.reward
 
     def get_state(self):
         state = {'episode_id': 0, 'step_id': 0, 'Map': {}, 'Player': {}, 'Social': {}}
@@ -419,62 +554,251 @@ class Game:
         return state
 
     def _get_obs(self):
+        # Observations of this step, built per player on first access (see `Observations`).
+        # Values shared by all players are computed once, for the first player that needs them.
+        if self._obs is not None:
+            self._obs.valid = False
+        shared = {}
+        if self.obs_mode == 'tensor':
+            build = lambda names: self._get_tensor_obs(self._get_players(names), shared)
+        else:
+            # Taken every step, so that the changes are relative to the previous step
+            shared['social_changes'] = self._get_social_changes()
+            build = lambda names: self._get_dict_obs(self._get_players(names), shared)
+        return Observations([player.name for player in self.players], build)
+
+    def _get_players(self, names):
+        return [self.player_dict[self.player_name2id[name]] for name in names]
+
+    @staticmethod
+    def _get_shared(shared, key, func):
+        if key not in shared:
+            shared[key] = func()
+        return shared[key]
+
+    def _get_dict_obs(self, players, shared):
+        # The `Map` and `Player` views of each player are built once per step and referred to by
+        # the observation of the player and by the sharings of the players it shares them with,
+        # and `Social` `global` / `changes` are built once per step for all players.
+        # They are shared objects: read them, do not change them.
+        # Observations without sharings, kept for the players sharing them with later ones
+        bases = self._get_shared(shared, 'bases', dict)
+        sharers = self._get_shared(shared, 'sharers', self._get_sharers)
+        needed = {}
+        for player in players:
+            needed[player] = None
+            for sharer in sharers[player]:
+                needed[sharer] = None
+        missing = [player for player in needed if player.name not in bases]
+        if missing:
+            bases.update(self._get_dict_bases(missing, shared))
         obs = {}
-        social_global = self._get_social_global()
-        groups = self._get_social_groups()
-        for player in self.players:
+        for player in players:
+            _obs = dict(bases[player.name])
+            _obs['Social'] = {**_obs['Social'], 'sharings': self._get_social_sharing(player, bases)}
+            _obs['action_mask'] = _obs['action_mask'].tolist()
+            obs[player.name] = _obs
+        return obs
+
+    def _get_world_views(self, players, build, keep=True):
+        # Views of the physical world of `players`, {player.name: view} from `build(players)`.
+        # The world does not change while it is frozen, so they are kept until it moves again
+        # (if `keep`, i.e. they do not depend on the social state either).
+        views = {player.name: self._frozen_views[player.name] for player in players if player.name in self._frozen_views}
+        missing = [player for player in players if player.name not in views]
+        if missing:
+            built = build(missing)
+            views.update(built)
+            if keep and self.world_frozen:
+                self._frozen_views.update(built)
+        return views
+
+    def _get_dict_views(self, players):
+        # {player.name: (Map info, Player info, action mask)}, the infos JSON-style already
+        views = {}
+        block_grids = self.grid_maps(players)
+        visible_players = self.spatial_index.visible_players(players)
+        action_masks = self.get_action_masks(players)
+        for player, action_mask in zip(players, action_masks):
+            map_info = {}
+            map_info['block_grids'] = block_grids[player.name].T
+            map_info['resources'] = self._get_visible_resource(player)
+            map_info['events'] = self._get_visible_event(player)
+            map_info['players'] = self._get_visible_player(player, visible_players[player.name])
+            player_info = player.get_dict_info()
+            player_info['inventory'] = player.get_inventory()
+            views[player.name] = (preprocess_obs(map_info), preprocess_obs(player_info), action_mask)
+        return views
+
+    def _get_dict_bases(self, players, shared):
+        obs = {}
+        social_global = self._get_shared(shared, 'social_global', self._get_social_global)
+        # JSON-style `global` and `changes`, shared by all observations of the step
+        social_json = self._get_shared(shared, 'social_json', lambda: preprocess_obs({
+            'global': social_global,
+            'changes': shared['social_changes'],
+        }))
+        views = self._get_world_views(players, self._get_dict_views)
+        for player in players:
+            map_info, player_info, action_mask = views[player.name]
             _obs = {'episode_id': 0, 'step_id': 0, 'Map': {}, 'Player': {}, 'Social': {}}
             _obs['episode_id'] = self.episodes
             _obs['step_id'] = self.steps
 
             '''Map Info'''
-            _obs['Map']['block_grids'] = self.grid_map(position=player.position, fov=player.fov).T
-            _obs['Map']['resources'] = self._get_visible_resource(player)
-            _obs['Map']['events'] = self._get_visible_event(player)
-            _obs['Map']['players'] = self._get_visible_player(player)
+            _obs['Map'] = map_info
 
             '''Player Info'''
-            _obs['Player'] = player.get_dict_info()
-            _obs['Player']['inventory'] = player.get_inventory()
+            _obs['Player'] = player_info
             
             '''Social Info'''
-            _obs['Social']['global'] = social_global
-            _obs['Social']['communications'] = self._get_single_communication(player)
-            # _obs['Social']['groups'] = groups
+            _obs['Social']['global'] = social_json['global']
+            _obs['Social']['changes'] = social_json['changes']
+            _obs['Social']['communications'] = preprocess_obs(self._get_single_communication(player))
+            # _obs['Social']['groups'] = self._get_social_groups()
             # _obs['Social']['social_graph'] = self.social.social_graph
+            _obs['action_mask'] = action_mask
             obs[player.name] = _obs
-        
-        for player in self.players:
-            obs[player.name]['Social']['sharings'] = self._get_social_sharing(player, obs)
-
-        def preprocess_obs(obs):
-            if isinstance(obs, dict):
-                return {k: preprocess_obs(v) for k, v in obs.items()}
-            elif isinstance(obs, list):
-                return [preprocess_obs(item) for item in obs]
-            elif isinstance(obs, np.ndarray):
-                return obs.tolist()
-            elif isinstance(obs, tuple):
-                return list(obs)
-            return obs
-
-        obs = preprocess_obs(obs)
-
         return obs
     
+    def _get_tensor_views(self, players, shared):
+        # {player.name: (grid observation, inventory, action mask)}, read-only when kept over steps
+        resource_ids = self._obs_resource_ids
+        if self.grid_view == 'map':
+            sharers = self._get_shared(shared, 'map_sharers', self._get_map_sharers)
+            grids = {player.name: self._get_map_view(player, sharers[player], resource_ids) for player in players}
+        else:
+            grids = self.grid_layers.crop(players, resource_ids)
+        action_masks = self.get_action_masks(players)
+        views = {}
+        for player, action_mask in zip(players, action_masks):
+            view = (grids[player.name].astype(np.int16), self._get_inventory_array(player), action_mask)
+            if self.world_frozen and self.grid_view != 'map':
+                for array in view:
+                    array.flags.writeable = False
+            views[player.name] = view
+        return views
+
+    def _get_map_view(self, player, sharers, resource_ids):
+        # Map-sized grid of `player` as `State.process_obs` builds it from the dict observations:
+        # the players seen by `player` or by its sharers, and the blocks of the sharers that are
+        # among them. Their positions are matched to the block grids of the sharers in order.
+        visible_players = self.spatial_index.visible_players([player, *sharers])
+        seen = {}
+        for viewer in [player, *sharers]:
+            seen.update(dict.fromkeys(visible_players[viewer.name]))
+        positions = [player.position] + [sharer.position for sharer in sharers if sharer in seen]
+        block_views = list(zip([player, *sharers], positions))
+        return self.grid_layers.crop_map(player, sharers, list(seen), block_views, resource_ids)
+
+    def _get_tensor_obs(self, players, shared):
+        # Map-sized grids show the views of the sharers too
+        views = self._get_world_views(
+            players, lambda players: self._get_tensor_views(players, shared), keep=self.grid_view != 'map'
+        )
+        social_state = self._get_shared(shared, 'social_state', self._get_social_state)
+        communications = self._get_shared(shared, 'communications', self._get_communication_arrays)
+        social_edges = self._get_shared(shared, 'social_edges', self.social.get_edge_list)
+        time = self._get_shared(shared, 'time', lambda: np.array([self.steps], dtype=np.int16))
+        obs = {}
+        for player in players:
+            grid, inventory, action_mask = views[player.name]
+            obs[player.name] = {
+                'grid_observation': grid,
+                'inventory': inventory,
+                'communication': communications[player._id],
+                'social_state': social_state,
+                'time': time,
+                'action_mask': action_mask,
+                'social_edges': social_edges,
+            }
+        return obs
+
+    def _get_resource_names(self):
+        names = {resource.name for resource in self.resources}
+        for event in self.events:
+            names.update(event.inputs.keys())
+            names.update(event.outputs.keys())
+        return [name for name in self.resource_grid.resource_names if name in names]
+
+    def _get_inventory_array(self, player):
+        return player.inventory[self._obs_resource_ids].astype(np.int16)
+
+    def get_action_masks(self, players=None):
+        # Legal physical actions of `players`, (len(players), 6 + 2 * n) rows of
+        # [move_up, move_down, move_left, move_right, no_act, produce, pick * n, dump * n]
+        # over the observed resources, in one pass over the game state:
+        # - pick: a pile the player can see here, below the capacity of the player
+        # - dump: held in the inventory
+        # - produce: an available event here, whose inputs the player holds and whose outcome fits
+        #   the capacities of the player
+        if players is None:
+            players = self.players
+        resource_ids = self._obs_resource_ids
+        resource_num = len(resource_ids)
+        xs = np.array([player.x for player in players], dtype=np.int64)
+        ys = np.array([player.y for player in players], dtype=np.int64)
+        inventories = np.array([player.inventory for player in players]).reshape(len(players), -1)
+        capabilities = np.array([player.capabilities for player in players])
+        inventory = inventories[:, resource_ids]
+        capacity = self._capacities[[player._id for player in players]]
+        action_masks = np.zeros((len(players), 6 + 2 * resource_num), dtype=np.int8)
+        action_masks[:, :5] = 1
+        # Produce
+        grid_layers = self.grid_layers
+        event_ids = grid_layers.event_ids[xs, ys]
+        produce = (event_ids >= 0) & self.event_scheduler.available_map[xs, ys]
+        if grid_layers.event_names:
+            event_here = grid_layers.event_layer(event_ids, resource_ids)
+            event_ids = np.where(produce, event_ids, 0)
+            produce &= np.all(inventories >= grid_layers.event_needs[event_ids], axis=1)
+            produce &= np.all(event_here + inventory <= capacity, axis=1)
+        action_masks[:, 5] = produce
+        # Pick
+        resource_here = self.resource_grid.counts[:, xs, ys].T
+        resource_visible = Capabilities.check(
+            self.resource_grid.requirement_masks[np.newaxis], capabilities[:, np.newaxis]
+        )
+        pickable = (resource_here > 0) & resource_visible
+        action_masks[:, 6:6 + resource_num] = pickable[:, resource_ids] & (inventory < capacity)
+        # Dump
+        action_masks[:, 6 + resource_num:] = inventory > 0
+        return action_masks
+
+    def _get_social_state(self):
+        # Transposed adjacency matrix over the social graph nodes, as `State.social_state2adj`
+        graph = self.social.graph
+        node2id = {node: i for i, node in enumerate(graph.nodes)}
+        social_state = np.zeros((len(node2id), len(node2id)), dtype=np.int8)
+        for u, v, _ in graph.edges():
+            social_state[node2id[v], node2id[u]] = 1
+        return social_state
+
+    def _get_communication_arrays(self):
+        # (to_player, from_player, communication_length), as `State.words_toarray`
+        communications = np.zeros((self.player_num, self.player_num, self.communication_length), dtype=np.int8)
+        for from_node, to_node, attr in self.social.relations('communication'):
+            communication_unit = attr.get('communication')
+            if communication_unit is not None and self.social.node_type(to_node) == 'player':
+                communications[to_node._id, from_node._id] = communication_unit
+        return communications
+
+    def _get_map_sharers(self):
+        # {player: [players sharing their map with it], ...} in the order of its `sharings`
+        sharers = {}
+        for player in self.players:
+            sharers[player] = []
+            for from_node, _, attr in self.social.in_relations(player):
+                attr = attr.get('sharing', {})
+                if attr and attr.get('Map') is True and self.social.node_type(from_node) == 'player':
+                    sharers[player].append(from_node)
+        return sharers
+
     def _get_all_resource(self):
-        resource_list = []
-        for resource in self.resource_dict.values():
-            while resource:
-                resource_list.append(resource.get_dict_info())
-                resource = resource.stacked_resource
-        return resource_list
+        return self.resource_grid.get_dict_info(self.resource_grid.counts)
 
     def _get_visible_resource(self, player):
-        visible_resources_dict = []
-        for resource in player.visible_resources:
-            visible_resources_dict.append(resource.get_dict_info())
-        return visible_resources_dict
+        return player.visible_resources
 
     def _get_visible_event(self, player):
         visible_events_dict = []
@@ -482,15 +806,18 @@ class Game:
             visible_events_dict.append(event.get_dict_info())
         return visible_events_dict
 
-    def _get_visible_player(self, player):
+    def _get_visible_player(self, player, visible_players=None):
+        if visible_players is None:
+            visible_players = player.visible_players
         visible_players_dict = []
-        for other_player in player.visible_players:
+        for other_player in visible_players:
             visible_players_dict.append(other_player.get_dict_info())
         return visible_players_dict
     
     def _get_all_communication(self):
         communication_list = []
-        for from_node, to_node, communication_unit in self.social.social_graph.edges(data = 'communication', default=None):
+        for from_node, to_node, attr in self.social.relations('communication'):
+            communication_unit = attr.get('communication')
             if communication_unit is not None:
                 communication_list.append({
                     "from": from_node._id,
@@ -501,7 +828,8 @@ class Game:
 
     def _get_single_communication(self, player):
         communication_list = []
-        for from_node, _, communication_unit in self.social.social_graph.in_edges(player, data = 'communication', default=None):
+        for from_node, _, attr in self.social.in_relations(player):
+            communication_unit = attr.get('communication')
             if communication_unit is not None:
                 communication_list.append({
                     "from": from_node._id,
@@ -512,21 +840,38 @@ class Game:
     
     def _get_social_groups(self):
         groups = []
-        for node, attr in self.social.social_graph.nodes(data=True):
-            if attr['type'] == 'group':
+        for node in self.social.nodes():
+            if self.social.node_type(node) == 'group':
                 groups.append(node)
         return groups
     
     def _get_social_global(self):
-        return {
-            "nodes": self.social.get_node_list(),
-            "edges": self.social.get_edge_list(),
-        }
+        return self.social.get_snapshot()
+
+    def _get_social_changes(self):
+        # Changes of the social graph since the previous observation (None for the first one)
+        changes = None
+        if self._social_version is not None:
+            changes = self.social.get_changes(self._social_version)
+            # Observations only ever ask for the changes since the previous one
+            self.social.forget_changes(self._social_version)
+        self._social_version = self.social.graph.version
+        return changes
         
+    def _get_sharers(self):
+        # {player: [players sharing their `Map` or `Player` observation with it], ...}
+        sharers = {player: [] for player in self.players}
+        for from_node, to_node, attr in self.social.relations('sharing'):
+            attr = attr.get('sharing', {})
+            if attr and (attr.get('Map') is True or attr.get('Player') is True) and from_node in sharers and to_node in sharers:
+                sharers[to_node].append(from_node)
+        return sharers
+
     def _get_social_sharing(self, player, obs):
         available_key = ['Map', 'Player']
         sharings = {}
-        for from_node, _, attr in self.social.social_graph.in_edges(player, data='sharing', default={}):
+        for from_node, _, attr in self.social.in_relations(player):
+            attr = attr.get('sharing', {})
             if attr:
                 for key in available_key:
                     if attr.get(key) is True:
@@ -544,7 +889,7 @@ class Game:
         return terminateds
 
     def _get_rewards(self):
-        return {player.name: player.reward for player in self.players}
+        return dict(zip(self.player_name2id, self.reward_vector.tolist()))
 
     def _get_infos(self):
         return {player.name: {} for player in self.players}
@@ -0,0 +1,175 @@
+import numpy as np
+
+# Dtypes of the layers: player ids + 1, event type ids (-1 for none), event inputs / outputs
+PLAYER_DTYPE = np.int16
+EVENT_ID_DTYPE = np.int32
+EVENT_VALUE_DTYPE = np.int16
+
+
+class GridLayers:
+    # Observation layers indexed by [x, y], stacked only in the crops handed out as
+    # (2 + 2 * resource_num, ...) arrays: players (id + 1), blocks, events (-inputs / +outputs)
+    # and resource counts.
+    # Only the dynamic layers are held per game: `player_layer` and `event_ids`. Blocks are a
+    # view of the map data of `world_map`, resources the counts of `resource_grid`, and the
+    # event layers are looked up from `event_values` (a row per event type, -1 a row of zeros).
+    def __init__(
+        self,
+        world_map,
+        resource_grid,
+        events,
+    ):
+        self.size_x, self.size_y = world_map.shape
+        self.resource_grid = resource_grid
+        self.resource_num = resource_grid.resource_num
+        self.player_layer = np.zeros((self.size_x, self.size_y), dtype=PLAYER_DTYPE)
+        # Blocks
+        self.load_blocks(world_map)
+        # Events
+        self.event_names = []
+        self._event2id = {}
+        self.event_requirements = []
+        self.event_requirement_masks = None
+        # Amount of each resource an event type needs to be triggered (as `Player.check_amount`)
+        self.event_needs = np.zeros((0, resource_grid.resource_num), dtype=np.int64)
+        self.event_values = np.zeros((1, resource_grid.resource_num), dtype=EVENT_VALUE_DTYPE)
+        self.event_ids = np.full((self.size_x, self.size_y), -1, dtype=EVENT_ID_DTYPE)
+        self.load_events(events)
+
+    def load_blocks(self, world_map):
+        # BLANK / BLOCK cells as 0 / 1, kept in sync by `WorldMap.add_block`
+        self.block_layer = world_map.map_data.T
+
+    def load_events(self, events):
+        self.event_ids[:] = -1
+        for event in events:
+            self.add_event(event)
+
+    def add_event(self, event):
+        if event.name not in self._event2id:
+            self._event2id[event.name] = len(self.event_names)
+            self.event_names.append(event.name)
+            self.event_requirements.append(event.requirements)
+            self.event_requirement_masks = self.resource_grid.capabilities.compile(self.event_requirements)
+            need = np.zeros((1, self.resource_grid.resource_num), dtype=np.int64)
+            for name, num in event.inputs.items():
+                need[0, self.resource_grid.resource_id(name)] = max(num, 1)
+            self.event_needs = np.concatenate([self.event_needs, need])
+            values = np.zeros((1, self.resource_grid.resource_num), dtype=EVENT_VALUE_DTYPE)
+            for name, num in event.inputs.items():
+                values[0, self.resource_grid.resource_id(name)] = -num
+            for name, num in event.outputs.items():
+                values[0, self.resource_grid.resource_id(name)] = num
+            # Before the row of zeros that `event_ids` -1 refers to
+            self.event_values = np.concatenate([self.event_values[:-1], values, self.event_values[-1:]])
+        x, y = event.position
+        self.event_ids[x, y] = self._event2id[event.name]
+
+    def event_layer(self, event_ids, resource_ids):
+        # (..., len(resource_ids)) event inputs / outputs of the cells of `event_ids`
+        return self.event_values[:, resource_ids][event_ids]
+
+    def load_players(self, players):
+        self.player_layer[:] = 0
+        for player in players:
+            self.player_layer[player.x, player.y] = player._id + 1
+
+    def move_players(self, prev_positions, players):
+        # Clear every previous cell first so that swapped players do not erase each other
+        moved = [(prev, player) for prev, player in zip(prev_positions, players) if prev != player.position]
+        for (x, y), _ in moved:
+            self.player_layer[x, y] = 0
+        for _, player in moved:
+            self.player_layer[player.x, player.y] = player._id + 1
+
+    def check_visible_events(self, player):
+        # Visibility of each event type to `player`
+        visible = np.zeros(len(self.event_names) + 1, dtype=bool)  # index -1 marks cells without events
+        if self.event_names:
+            visible[:-1] = self.resource_grid.capabilities.check(self.event_requirement_masks, player.capabilities)
+        return visible
+
+    def window_mask(self, player):
+        # (size_x, size_y) mask of the cells in the FOV of `player`
+        h, v = player.fov
+        rows = np.arange(player.x - h, player.x + h + 1) % self.size_x
+        cols = np.arange(player.y - v, player.y + v + 1) % self.size_y
+        mask = np.zeros((self.size_x, self.size_y), dtype=bool)
+        mask[np.ix_(rows, cols)] = True
+        return mask
+
+    def crop(self, players, resource_ids=None):
+        # Ego-centric toroidal crops for all `players` in one gather per FOV shape.
+        # Returns {player.name: (2 + 2 * len(resource_ids), 2h + 1, 2v + 1)} int16 arrays
+        resource_ids = self._get_resource_ids(resource_ids)
+        counts = self.resource_grid.counts
+        fov_groups = {}
+        for player in players:
+            fov_groups.setdefault(tuple(player.fov), []).append(player)
+        crops = {}
+        for (h, v), group in fov_groups.items():
+            xs = np.array([player.x for player in group])
+            ys = np.array([player.y for player in group])
+            rows = (xs[:, np.newaxis] + np.arange(-h, h + 1)) % self.size_x
+            cols = (ys[:, np.newaxis] + np.arange(-v, v + 1)) % self.size_y
+            rows, cols = rows[:, :, np.newaxis], cols[:, np.newaxis, :]
+            # (player, layer, 2h + 1, 2v + 1)
+            windows = np.empty((len(group), 2 + 2 * len(resource_ids), 2 * h + 1, 2 * v + 1), dtype=np.int16)
+            event_end = 2 + len(resource_ids)
+            event_ids = self.event_ids[rows, cols]
+            windows[:, 0] = self.player_layer[rows, cols]
+            windows[:, 1] = self.block_layer[rows, cols]
+            windows[:, 2:event_end] = np.moveaxis(self.event_layer(event_ids, resource_ids), -1, 1)
+            windows[:, event_end:] = counts[resource_ids[:, np.newaxis, np.newaxis], rows[:, np.newaxis], cols[:, np.newaxis]]
+            for player, window, event_id in zip(group, windows, event_ids):
+                resource_visible = self.resource_grid.check_visible(player)[resource_ids]
+                event_visible = self.check_visible_events(player)[event_id]
+                window[2:event_end] *= event_visible
+                window[event_end:] *= resource_visible[:, np.newaxis, np.newaxis]
+                crops[player.name] = window
+        return crops
+
+    def crop_map(self, player, viewers=(), players=(), block_views=(), resource_ids=None):
+        # Map-sized crop with `player` at [size_x // 2, size_y // 2], laid out as
+        # `State.process_obs` lays out the dict observations of `player` and of `viewers`
+        # (players sharing their map with `player`):
+        # - `player` and `players` on the player layer,
+        # - for each (viewer, position) of `block_views`, the blocks in the FOV of `viewer`
+        #   laid over the cells around `position`,
+        # - the events and resources in the FOV of `player` or of any of `viewers` and
+        #   visible to that player.
+        resource_ids = self._get_resource_ids(resource_ids)
+        player_cells = np.zeros((self.size_x, self.size_y), dtype=PLAYER_DTYPE)
+        for other in [player, *players]:
+            player_cells[other.position] = other._id + 1
+        block_cells = np.zeros((self.size_x, self.size_y), dtype=bool)
+        for viewer, (x, y) in block_views:
+            h, v = viewer.fov
+            window = np.ix_(np.arange(-h, h + 1), np.arange(-v, v + 1))
+            source = (window[0] + viewer.x) % self.size_x, (window[1] + viewer.y) % self.size_y
+            target = (window[0] + x) % self.size_x, (window[1] + y) % self.size_y
+            block_cells[target] |= self.block_layer[source] > 0
+        event_mask = np.zeros((self.size_x, self.size_y), dtype=bool)
+        resource_mask = np.zeros((len(resource_ids), self.size_x, self.size_y), dtype=bool)
+        for viewer in [player, *viewers]:
+            window = self.window_mask(viewer)
+            event_mask |= window & self.check_visible_events(viewer)[self.event_ids]
+            resource_visible = self.resource_grid.check_visible(viewer)[resource_ids]
+            resource_mask |= window & resource_visible[:, np.newaxis, np.newaxis]
+        rows = (np.arange(self.size_x) + player.x - self.size_x // 2) % self.size_x
+        cols = (np.arange(self.size_y) + player.y - self.size_y // 2) % self.size_y
+        rows, cols = rows[:, np.newaxis], cols[np.newaxis, :]
+        event_end = 2 + len(resource_ids)
+        layers = np.empty((2 + 2 * len(resource_ids), self.size_x, self.size_y), dtype=np.int16)
+        layers[0] = player_cells[rows, cols]
+        layers[1] = block_cells[rows, cols]
+        events = np.moveaxis(self.event_layer(self.event_ids[rows, cols], resource_ids), -1, 0)
+        layers[2:event_end] = events * event_mask[rows, cols]
+        counts = self.resource_grid.counts[resource_ids[:, np.newaxis, np.newaxis], rows, cols]
+        layers[event_end:] = counts * resource_mask[:, rows, cols]
+        return layers
+
+    def _get_resource_ids(self, resource_ids):
+        if resource_ids is None:
+            resource_ids = np.arange(self.resource_num)
+        return np.asarray(resource_ids, dtype=np.int64)
@@ -14,13 +14,20 @@ class Group:
     def remove_player(self, player):
         self.players.remove(player)
 
+    def snapshot(self):
+        return list(self.players), self._cached_score
+
+    def restore(self, state):
+        players, self._cached_score = state
+        self.players = list(players)
+
     def earn_score(self, score):
         self._cached_score += score
 
-    def split_score(self, social_graph, attribute):
+    def split_score(self, social, attribute):
         weights = []
         for player in self.players:
-            weight = social_graph.edges[self, player].get(attribute, 0)
+            weight = social.get_relation(self, player).get(attribute, 0)
             weights.append(weight)
         weight_sum = sum(weights)
         for player, weight in zip(self.players, weights):
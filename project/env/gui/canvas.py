@@ -1,3 +1,4 @@
+import numpy as np
 import pygame
 
 from .cell import Cell
@@ -60,39 +61,32 @@ class Canvas:
             ))
         self.add_layer(units)
 
-    def load_all_resource(self, resource_dict):
+    def load_all_resource(self, resource_grid):
         units = []
-        for pos, resource in resource_dict.items():
+        for x, y in zip(*np.nonzero(resource_grid.counts.any(axis=0))):
             units.append(Cell(
-                _id=resource.name,
-                x=pos[0]*self.tile_w,
-                y=pos[1]*self.tile_h,
+                _id=resource_grid.names_at((x, y))[0],
+                x=x*self.tile_w,
+                y=y*self.tile_h,
                 width=self.tile_w,
                 height=self.tile_h,
             ))
         self.add_layer(units)
 
-    def load_global_resource(self, resource_dict, players):
+    def load_global_resource(self, resource_grid, players):
         units = []
-        for pos, resource in resource_dict.items():
-            visible = False
-            while resource:
-                for player in players:
-                    if resource.check_visible(player):
-                        visible = True
-                        break
-                if visible:
-                    break
-                else:
-                    resource = resource.stacked_resource
-            if visible:
-                units.append(Cell(
-                    _id=resource.name,
-                    x=pos[0]*self.tile_w,
-                    y=pos[1]*self.tile_h,
-                    width=self.tile_w,
-                    height=self.tile_h,
-                ))
+        visible = np.zeros(resource_grid.resource_num, dtype=bool)
+        for player in players:
+            visible |= resource_grid.check_visible(player)
+        counts = resource_grid.counts * visible[:, np.newaxis, np.newaxis]
+        for x, y in zip(*np.nonzero(counts.any(axis=0))):
+            units.append(Cell(
+                _id=resource_grid.resource_names[np.flatnonzero(counts[:, x, y])[0]],
+                x=x*self.tile_w,
+                y=y*self.tile_h,
+                width=self.tile_w,
+                height=self.tile_h,
+            ))
         self.add_layer(units)
 
     def load_local_resource(self, players):
@@ -100,9 +94,9 @@ class Canvas:
         for player in players:
             for resource in player.visible_resources:
                 units.append(Cell(
-                    _id=resource.name,
-                    x=resource.position[0]*self.tile_w,
-                    y=resource.position[1]*self.tile_h,
+                    _id=resource['name'],
+                    x=resource['position'][0]*self.tile_w,
+                    y=resource['position'][1]*self.tile_h,
                     width=self.tile_w,
                     height=self.tile_h,
                 ))
@@ -124,9 +118,9 @@ class Canvas:
         self.load_map(self.game.world_map)
         self.load_event(self.game.event_dict)
         if visible_resource == 'all':
-            self.load_all_resource(self.game.resource_dict)
+            self.load_all_resource(self.game.resource_grid)
         elif visible_resource == 'global':
-            self.load_global_resource(self.game.resource_dict, self.game.players)
+            self.load_global_resource(self.game.resource_grid, self.game.players)
         elif visible_resource == 'local':
             self.load_local_resource(self.game.players)
         self.players.update(frame_offset=frame_offset)
@@ -0,0 +1,46 @@
+from collections.abc import Mapping
+
+
+class Observations(Mapping):
+    # {player_name: observation} of one step. Observations are built on first access, in batches
+    # by `build(names)` -> {name: observation}, and cached. They can only be built while the game
+    # is still at that step: the game sets `valid` to False once it moved on.
+    def __init__(self, names, build):
+        self._names = list(names)
+        self._build = build
+        self._cache = {}
+        self.valid = True
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._names:
+                raise KeyError(name)
+            self.load([name])
+        return self._cache[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, names):
+        # Build the observations of `names` that are not built yet, in one batch
+        missing = [name for name in names if name not in self._cache]
+        if missing:
+            if not self.valid:
+                raise RuntimeError('The game moved past the step of these observations')
+            self._cache.update(self._build(missing))
+        return self
+
+    def __reduce__(self):
+        # Copies and pickles are plain dicts of all the observations
+        return dict, (self.to_dict(),)
+
+    def to_dict(self):
+        return self.subset(self._names)
+
+    def subset(self, names):
+        # {name: observation} of `names` only
+        self.load(names)
+        return {name: self._cache[name] for name in names}
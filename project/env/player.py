@@ -1,3 +1,11 @@
+import numpy as np
+
+from .action_codes import DUMP_BY_NAME, MOVE_DELTAS, MOVE_RIGHT, MOVE_UP, PHYSICAL_ACTIONS, PICK_BY_NAME, PRODUCE
+
+# (dx, dy) of each action code as Python ints
+MOVE_STEPS = MOVE_DELTAS.tolist()
+
+
 class Player:
     def __init__(
         self,
@@ -8,6 +16,8 @@ class Player:
         position,
         rotation,
         inventory_size,
+        resource_names,
+        resource_scores,
         init_resources=[],
         resource_max_dict={},
         resource_preference_dict={},
@@ -28,14 +38,24 @@ class Player:
             self.fov = [fov[0], fov[1]]
         else:
             raise ValueError
-        # TODO
-        self.inventory = {}
+        # Inventory: resource amounts indexed by the id of the resource in `resource_names`
+        self.resource_names = resource_names
+        self._resource2id = {name: i for i, name in enumerate(resource_names)}
+        self.inventory = np.zeros(len(resource_names), dtype=np.int64)
         self.inventory_size = inventory_size
         self.resource_total = 0
         self.resource_max_dict = resource_max_dict
         self.resource_preference_dict = resource_preference_dict
+        # Unit score of each resource: the preference of the player, or else the default score
+        self.resource_scores = np.array(resource_scores, dtype=np.float64)
+        for name, score in resource_preference_dict.items():
+            self.resource_scores[self._resource2id[name]] = score
+        # Score change since the last `post_update`, tracked wherever the inventory changes
+        self._score_delta = 0
+        # (version, bitmask) of `capabilities`, cleared wherever the inventory changes
+        self._capabilities = None
         for resource in init_resources:
-            self.pick_up(resource)
+            self.pick_up(resource.name, resource.amount)
         self.terminated = False
         # Social
         self.groups = set()
@@ -80,7 +100,8 @@ class Player:
     def pre_update(self):
         pass
     
-    def update(self, actions):
+    def update(self, actions, social_only=False):
+        # `social_only`: skip the physical actions
         if not isinstance(actions, list):
             actions = [actions]
         for action in actions:
@@ -92,8 +113,22 @@ class Player:
                 kwargs = action.get('kwargs', {})
             else:
                 _action, kwargs = action
+            if social_only and _action in PHYSICAL_ACTIONS:
+                continue
             self._action_funcs[_action](**kwargs)
 
+    def update_coded(self, code, arg=0):
+        # A single integer-coded action (see `action_codes`), `arg` being the resource id of a pick
+        # or dump
+        if MOVE_UP <= code <= MOVE_RIGHT:
+            self.move(*MOVE_STEPS[code])
+        elif code == PRODUCE:
+            self._act_produce()
+        elif code == PICK_BY_NAME:
+            self._act_pick_by_name(self.resource_names[arg])
+        elif code == DUMP_BY_NAME:
+            self._act_dump_by_name(self.resource_names[arg])
+
     def post_update(self):
         # Move
         #if self.is_moved:
@@ -104,11 +139,41 @@ class Player:
         self.is_moved = False
         # Update score
         self.prev_score = self.score
-        self.score = 0
-        for resources in self.inventory.values():
-            for resource in resources:
-                self.score += resource.score
-        self.reward = self.score - self.prev_score
+        self.reward = float(self._score_delta)
+        self.score += self.reward
+        self._score_delta = 0
+
+    def set_position(self, position):
+        self.x, self.y = position
+        self.next_x, self.next_y = self.x, self.y
+        self.next_scolled_x, self.next_scolled_y = self.x, self.y
+
+    def snapshot(self):
+        return {
+            'position': (self.x, self.y),
+            'next_position': (self.next_x, self.next_y),
+            'next_scolled_position': (self.next_scolled_x, self.next_scolled_y),
+            'is_moved': self.is_moved,
+            'inventory': self.inventory.copy(),
+            'score': (self.prev_score, self.score, self._score_delta, self.reward),
+            'shared_score': (self._shared_score_in, self._shared_score_out),
+            'terminated': self.terminated,
+            'groups': set(self.groups),
+            'group_dict': {attribute: set(groups) for attribute, groups in self.group_dict.items()},
+        }
+
+    def restore(self, state):
+        self.x, self.y = state['position']
+        self.next_x, self.next_y = state['next_position']
+        self.next_scolled_x, self.next_scolled_y = state['next_scolled_position']
+        self.is_moved = state['is_moved']
+        self.inventory[:] = state['inventory']
+        self._capabilities = None
+        self.prev_score, self.score, self._score_delta, self.reward = state['score']
+        self._shared_score_in, self._shared_score_out = state['shared_score']
+        self.terminated = state['terminated']
+        self.groups = set(state['groups'])
+        self.group_dict = {attribute: set(groups) for attribute, groups in state['group_dict'].items()}
 
     def undo_action(self):
         self.next_x = self.x
@@ -124,50 +189,39 @@ class Player:
         self.next_scolled_y = self.next_y % self.game.world_map.size_y
         self.is_moved = True
 
-    def pick_up(self, resource):
-        name = resource.name
-        if self.resource_total + resource.amount > self.inventory_size:
-            resource.amount = self.inventory_size - self.resource_total
-        if resource.amount <= 0:
+    def pick_up(self, resource_name, amount):
+        if self.resource_total + amount > self.inventory_size:
+            amount = int(self.inventory_size - self.resource_total)
+        if amount <= 0:
             return
-        if resource.name in self.resource_preference_dict:
-            resource.set_unit_score(self.resource_preference_dict[resource.name])
-        if name in self.inventory:
-            self.inventory[name].append(resource)
-        else:
-            self.inventory[name] = [resource]
+        resource_id = self._resource2id[resource_name]
+        self.inventory[resource_id] += amount
+        self._score_delta += amount * self.resource_scores[resource_id]
+        self._capabilities = None
 
     def dump(self, resource_name, n):
-        resources = self.inventory.get(resource_name, [])
-        remain_n = n
-        while resources and remain_n > 0:
-            resource = resources[0]
-            dumped_resource = resource.provide(remain_n)
-            dumped_resource.set_position(self.position)
-            dumped_resource.reset_unit_score()
-            self.game.lay_resource(dumped_resource)
-            remain_n -= dumped_resource.amount
-            if not resource.is_available:
-                del resources[0]
+        resource_id = self._resource2id[resource_name]
+        amount = min(n, self.inventory[resource_id])
+        if amount <= 0:
+            return
+        self.inventory[resource_id] -= amount
+        self._score_delta -= amount * self.resource_scores[resource_id]
+        self._capabilities = None
+        self.game.lay_resource(self.position, resource_name, int(amount))
 
     def check_amount(self, resource_name, n):
-        resources = self.inventory.get(resource_name, [])
-        remain_n = n
-        for resource in resources:
-            remain_n -= resource.amount
-            if remain_n <= 0:
-                return True
-        return False
+        resource_id = self._resource2id.get(resource_name)
+        if resource_id is None:
+            return False
+        return self.inventory[resource_id] >= max(n, 1)
 
     def consume(self, resource_name, n):
-        resources = self.inventory.get(resource_name, [])
-        remain_n = n
-        while resources and remain_n > 0:
-            resource = resources[0]
-            remain_n = resource.consume(remain_n)
-            if not resource.is_available:
-                del resources[0]
-        return remain_n
+        resource_id = self._resource2id[resource_name]
+        amount = min(n, self.inventory[resource_id])
+        self.inventory[resource_id] -= amount
+        self._score_delta -= amount * self.resource_scores[resource_id]
+        self._capabilities = None
+        return n - amount
 
     def earn_score(self, score):
         self._shared_score_in += score
@@ -211,7 +265,10 @@ class Player:
         }
         
     def get_inventory(self):
-        return [resource.observation for resources in self.inventory.values() for resource in resources]
+        return [
+            {'name': self.resource_names[i], 'amount': int(self.inventory[i])}
+            for i in np.flatnonzero(self.inventory)
+        ]
 
     @property
     def observation(self):
@@ -243,45 +300,35 @@ class Player:
     def visible_resources(self):
         x, y = self.position
         h, v = self.fov
-        resources = []
-        for dh in range(-h, h + 1):
-            for dv in range(-v, v + 1):
-                scolled_x = (x + dh) % self.game.world_map.size_x
-                scolled_y = (y + dv) % self.game.world_map.size_y
-                resource = self.game.resource_dict.get((scolled_x, scolled_y))
-                while resource:
-                    if resource.check_visible(self):
-                        resources.append(resource)
-                    resource = resource.stacked_resource
-        return resources
+        resource_grid = self.game.resource_grid
+        return resource_grid.get_dict_info(
+            resource_grid.window(self.position, self.fov),
+            x_offset=x - h,
+            y_offset=y - v,
+            visible=resource_grid.check_visible(self),
+        )
+
+    @property
+    def capabilities(self):
+        # Capability bitmask of the inventory (see `Capabilities`), recomputed after it changed
+        table = self.game.resource_grid.capabilities
+        if self._capabilities is None or self._capabilities[0] != table.version:
+            self._capabilities = (table.version, table.of(self.inventory))
+        return self._capabilities[1]
 
     @property
     def visible_events(self):
         x, y = self.position
         h, v = self.fov
-        events = []
-        for dh in range(-h, h + 1):
-            for dv in range(-v, v + 1):
-                scolled_x = (x + dh) % self.game.world_map.size_x
-                scolled_y = (y + dv) % self.game.world_map.size_y
-                event = self.game.event_dict.get((scolled_x, scolled_y))
-                if event and event.check_visible(self):
-                    events.append(event)
-        return events
+        grid_layers = self.game.grid_layers
+        rows = np.arange(x - h, x + h + 1) % self.game.world_map.size_x
+        cols = np.arange(y - v, y + v + 1) % self.game.world_map.size_y
+        visible = grid_layers.check_visible_events(self)[grid_layers.event_ids[np.ix_(rows, cols)]]
+        return [self.game.event_dict[(int(rows[i]), int(cols[j]))] for i, j in zip(*np.nonzero(visible))]
 
     @property
     def visible_players(self):
-        x, y = self.position
-        h, v = self.fov
-        players = []
-        for dh in range(-h, h + 1):
-            for dv in range(-v, v + 1):
-                scolled_x = (x + dh) % self.game.world_map.size_x
-                scolled_y = (y + dv) % self.game.world_map.size_y
-                player = self.game.player_position.get((scolled_x, scolled_y))
-                if player and player.name != self.name:
-                    players.append(player)
-        return players
+        return self.game.spatial_index.visible_players([self])[self.name]
 
     def _obs_grid(self):
         return self.game.grid_map(self.position, self.fov)
@@ -290,7 +337,7 @@ class Player:
         return list(self.position)
 
     def _obs_inventory(self):
-        return [resource.observation for resources in self.inventory.values() for resource in resources]
+        return self.get_inventory()
 
     def _act_null(self, **kwargs):
         pass
@@ -311,20 +358,19 @@ class Player:
         self.move(0, 1)
 
     def _act_pick(self, **kwargs):
-        resource = self.game.resource_dict.get(self.position)
-        if resource and resource.check_visible(self):
-            resource = self.game.provide_resource(self.position)
-            if resource:
-                self.pick_up(resource)
-                # print(f'Player {self._id} picked up a {resource.name} at ({self.x}, {self.y}).')
+        resource_grid = self.game.resource_grid
+        for resource_name in resource_grid.names_at(self.position):
+            if resource_grid.is_visible(resource_name, self):
+                self._act_pick_by_name(resource_name)
+                return
 
     def _act_pick_by_name(self, resource_name, **kwargs):
-        resource = self.game.bubble_up_resource(self.position, resource_name)
-        if resource and resource.check_visible(self):
-            resource = self.game.provide_resource(self.position)
-            if resource:
-                self.pick_up(resource)
-                # print(f'Player {self._id} picked up a {resource.name} at ({self.x}, {self.y}).')
+        resource_grid = self.game.resource_grid
+        if resource_grid.amount(self.position, resource_name) > 0 and resource_grid.is_visible(resource_name, self):
+            amount = self.game.provide_resource(self.position, resource_name)
+            if amount:
+                self.pick_up(resource_name, amount)
+                # print(f'Player {self._id} picked up a {resource_name} at ({self.x}, {self.y}).')
 
     def _act_dump_by_name(self, resource_name, **kwargs):
         self.dump(resource_name, n=1)
@@ -341,9 +387,11 @@ class Player:
             # Produce
             for name, num in event.inputs.items():
                 self.consume(name, num)
-            for resource in event.provide():
-                self.pick_up(resource)
-                # print(f'Player {self._id} produce: {resource.name} at ({self.x}, {self.y}).')
+            for name, num in event.provide():
+                self.pick_up(name, num)
+                # print(f'Player {self._id} produce: {name} at ({self.x}, {self.y}).')
+            # Cool the event down for its `avail_interval`
+            self.game.event_scheduler.start(event)
 
     def _act_add_relation(self, to_player_id, attributes_dict={}, **kwargs):
         player_to = self.game.player_dict[to_player_id]
@@ -366,28 +414,29 @@ class Player:
         self.game.social.check_relation(self, player_to, **attribute_dict)
 
     def _act_scale_value(self, group, attr, scale, **kwargs):
-        for pred, _, data in self.game.social.social_graph.out_edges(group, data=True):
+        social = self.game.social
+        for _, player, data in list(social.out_relations(group)):
             if attr in data:
-                data[attr] *= scale
+                social.add_relation(group, player, **{attr: data[attr] * scale})
 
     def _act_request_matching(self, to_player_id, **kwargs):
         self._act_add_relation(to_player_id, attributes_dict={'matching_request_step': self.game.steps})
     
     def _act_accept_proposal(self, to_player_id, scale, **kwargs):
-        social_graph = self.game.social.social_graph
+        social = self.game.social
         player_to = self.game.player_dict[to_player_id]
-        groupA = next((group for group in social_graph.predecessors(self)
-                       if social_graph.nodes[group].get('type') == 'group'), None)
-        groupB = next((group for group in social_graph.predecessors(player_to)
-                       if social_graph.nodes[group].get('type') == 'group'), None)
+        groupA = next((group for group in social.predecessors(self)
+                       if social.node_type(group) == 'group'), None)
+        groupB = next((group for group in social.predecessors(player_to)
+                       if social.node_type(group) == 'group'), None)
         accept_score1 = scale
         accept_score2 = 1 - scale
         if groupA is not None:
             self._act_scale_value(groupA, attr='score', scale=scale)
-            accept_score1 = social_graph[groupA][self]['score']
+            accept_score1 = social.get_relation(groupA, self)['score']
         if groupB is not None:
             self._act_scale_value(groupB, attr='score', scale=1-scale)
-            accept_score2 = social_graph[groupB][player_to]['score']
+            accept_score2 = social.get_relation(groupB, player_to)['score']
 
         self.game.social.add_relation(self, player_to, **{'accept': accept_score1})
         self.game.social.add_relation(player_to, self, **{'accept': accept_score2})
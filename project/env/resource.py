@@ -7,7 +7,6 @@ class Resource:
         amount,
         requirements={},
         unit_score=0,
-        stacked_resource=None
     ):
         self.name = name
         self._type = _type
@@ -20,7 +19,6 @@ class Resource:
         self.requirements = requirements
         self.default_unit_score = unit_score
         self.unit_score = unit_score
-        self.stacked_resource = stacked_resource
 
     def update(self):
         pass
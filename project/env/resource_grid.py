@@ -0,0 +1,99 @@
+import numpy as np
+
+from .capability import Capabilities
+
+# Pile amounts, within the int16 range of the observation arrays
+COUNT_DTYPE = np.int16
+
+
+class ResourceGrid:
+    # Resource piles on the map, stored as counts indexed by [resource_id, x, y]
+    def __init__(
+        self,
+        size_x,
+        size_y,
+        resource_config,
+    ):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.resource_config = resource_config
+        self.resource_names = list(resource_config.keys())
+        self.resource_num = len(self.resource_names)
+        self._resource2id = {name: i for i, name in enumerate(self.resource_names)}
+        self.requirements = [resource_config[name].get('requirements', {}) for name in self.resource_names]
+        # Visibility requirements as bitmasks, matched against `Player.capabilities`
+        self.capabilities = Capabilities(self.resource_names)
+        self.requirement_masks = self.capabilities.compile(self.requirements)
+        self.counts = np.zeros((self.resource_num, size_x, size_y), dtype=COUNT_DTYPE)
+
+    def resource_id(self, resource_name):
+        return self._resource2id[resource_name]
+
+    def amount(self, position, resource_name):
+        x, y = position
+        return self.counts[self._resource2id[resource_name], x, y]
+
+    def names_at(self, position):
+        x, y = position
+        return [self.resource_names[i] for i in np.flatnonzero(self.counts[:, x, y])]
+
+    def lay(self, position, resource_name, amount):
+        x, y = position
+        self.counts[self._resource2id[resource_name], x, y] += amount
+
+    def provide(self, position, resource_name, require_num=1):
+        # Take up to `require_num` units from the pile and return the amount taken
+        resource_id = self._resource2id[resource_name]
+        x, y = position
+        amount = min(require_num, self.counts[resource_id, x, y])
+        if amount <= 0:
+            return 0
+        self.counts[resource_id, x, y] -= amount
+        return int(amount)
+
+    def clear(self):
+        self.counts.fill(0)
+
+    def snapshot(self):
+        # Non-empty piles only: (resource ids, xs, ys) and their amounts
+        cells = np.nonzero(self.counts)
+        return {
+            'cells': cells,
+            'amounts': self.counts[cells],
+        }
+
+    def restore(self, state):
+        self.clear()
+        self.counts[state['cells']] = state['amounts']
+
+    def is_visible(self, resource_name, player):
+        return self.check_visible(player)[self._resource2id[resource_name]]
+
+    def check_visible(self, player):
+        # Visibility of each resource type to `player`
+        return self.capabilities.check(self.requirement_masks, player.capabilities)
+
+    def window(self, position, fov):
+        # Toroidal (resource_num, 2h+1, 2v+1) window centered on `position`
+        x, y = position
+        h, v = fov
+        rows = np.arange(x - h, x + h + 1) % self.size_x
+        cols = np.arange(y - v, y + v + 1) % self.size_y
+        return self.counts[:, rows][:, :, cols]
+
+    def get_dict_info(self, counts, x_offset=0, y_offset=0, visible=None):
+        # Dict infos of non-empty piles in `counts`, ordered by x, y and resource id
+        if visible is not None:
+            counts = counts * visible[:, np.newaxis, np.newaxis]
+        infos = []
+        for x, y, resource_id in zip(*np.nonzero(counts.transpose(1, 2, 0))):
+            infos.append({
+                'name': self.resource_names[resource_id],
+                'position': (int(x + x_offset) % self.size_x, int(y + y_offset) % self.size_y),
+                'amount': int(counts[resource_id, x, y]),
+            })
+        return infos
+
+    @property
+    def observation(self):
+        return self.counts
@@ -1,85 +1,134 @@
-import networkx as nx
+from collections import deque
+
 from .group import Group
+from .social_graph import SocialGraph
 
 
 class Social:
     def __init__(self, players):
         self.players = players
-        self.social_graph = nx.DiGraph()
-        for player in players:
-            self.social_graph.add_node(player)
-            self.social_graph.nodes[player].update(
-                {
-                    'type': 'player',
-                    'id': player._id
-                }
-            )
-            self.social_graph.nodes[player]['_dict_view'] = self.node_to_dict(self.social_graph.nodes[player])
+        # Players and groups are nodes of `graph` under integer node ids
+        self.graph = SocialGraph()
+        self.node_ids = {}
+        self.node_objects = {}
+        # Also kept for removed nodes, to describe them in changes, until the log no longer holds
+        # their removal: [(version after the removal, node id), ...] in order
+        self._node_attrs = {}
+        self._removed_nodes = deque()
+        for player in self.players:
+            self._add_node(player, type='player', id=player._id)
+        self._node_list = None
+        self._edge_list = None
+        self._list_version = -1
         self.group_dict = {}
         self.next_group_id = 0
         self.obs = {}
         self.sharings = {}
         self.communications = []
 
+    def _add_node(self, node, **attr):
+        u = self.graph.add_node(**attr)
+        self.node_ids[node] = u
+        self.node_objects[u] = node
+        self._node_attrs[u] = attr
+
+    def _remove_node(self, node):
+        u = self.node_ids.pop(node)
+        del self.node_objects[u]
+        self.graph.remove_node(u)
+        self._removed_nodes.append((self.graph.version, u))
+
+    def _prune_node_attrs(self):
+        while self._removed_nodes and self._removed_nodes[0][0] <= self.graph.log_start:
+            _, u = self._removed_nodes.popleft()
+            del self._node_attrs[u]
+
+    def forget_changes(self, version):
+        # The changes before `version` are no longer asked for by `get_changes`
+        self.graph.truncate(version)
+        self._prune_node_attrs()
+
+    def snapshot(self):
+        return {
+            'graph': self.graph.snapshot(),
+            'node_ids': dict(self.node_ids),
+            'node_objects': dict(self.node_objects),
+            'node_attrs': dict(self._node_attrs),
+            'removed_nodes': list(self._removed_nodes),
+            'group_dict': dict(self.group_dict),
+            'groups': [group.snapshot() for group in self.group_dict.values()],
+            'next_group_id': self.next_group_id,
+            'obs': self.obs,
+            'sharings': self.sharings,
+            'communications': self.communications,
+        }
+
+    def restore(self, state):
+        self.graph.restore(state['graph'])
+        self.node_ids = dict(state['node_ids'])
+        self.node_objects = dict(state['node_objects'])
+        self._node_attrs = dict(state['node_attrs'])
+        self._removed_nodes = deque(state['removed_nodes'])
+        # The restored graph starts a new log
+        self._prune_node_attrs()
+        self.group_dict = dict(state['group_dict'])
+        for group, group_state in zip(self.group_dict.values(), state['groups']):
+            group.restore(group_state)
+        self.next_group_id = state['next_group_id']
+        self.obs = state['obs']
+        self.sharings = state['sharings']
+        self.communications = state['communications']
+        self._list_version = -1
+
     def check_relation(self, player_from, player_to, **attr):
-        if self.social_graph.has_edge(player_from, player_to):
-            if list(attr.keys())[0] in self.social_graph.edges[player_from, player_to]:
-                return list(attr.values())[0] == self.social_graph.edges[player_from, player_to][list(attr.keys())[0]]
+        if self.has_relation(player_from, player_to):
+            if list(attr.keys())[0] in self.get_relation(player_from, player_to):
+                return list(attr.values())[0] == self.get_relation(player_from, player_to)[list(attr.keys())[0]]
         return False
 
     def add_relation(self, player_from, player_to, **attr):
-        self.social_graph.add_edge(player_from, player_to, **attr)
-        self.update_edge_dict(player_from, player_to)
+        self.graph.add_edge(self.node_ids[player_from], self.node_ids[player_to], **attr)
 
     def remove_relation(self, player_from, player_to, attribute):
-        if attribute in self.social_graph.edges[player_from, player_to]:
-            del self.social_graph.edges[player_from, player_to][attribute]
-            del self.social_graph.edges[player_from, player_to]['_dict_view']['attributes'][attribute]
-        if len(self.social_graph.edges[player_from, player_to]) == 1:
-            assert '_dict_view' in self.social_graph.edges[player_from, player_to]
-            self.social_graph.remove_edge(player_from, player_to)
+        u, v = self.node_ids[player_from], self.node_ids[player_to]
+        data = self.graph.edge(u, v)
+        if attribute in data:
+            self.graph.remove_edge_attr(u, v, attribute)
+        if not data:
+            self.graph.remove_edge(u, v)
 
     def create_group(self, name='', **attr):
         group = Group(_id=self.next_group_id, name=name, players=[])
         self.group_dict[self.next_group_id] = group
         self.next_group_id += 1
-        self.social_graph.add_node(group, **attr)
-        self.social_graph.nodes[group].update(
-            {
-                'type': 'group',
-                'id': group._id,
-            }
-        )
-        self.social_graph.nodes[group]['_dict_view'] = self.node_to_dict(self.social_graph.nodes[group])
+        self._add_node(group, **{**attr, 'type': 'group', 'id': group._id})
         return group
 
     def remove_group(self, group):
-        for player in group.players:
+        for player in list(group.players):
             self.quit_group(player, group)
-        self.social_graph.remove_node(group)
+        self._remove_node(group)
         self.group_dict.pop(group._id, None)
 
     def join_group(self, player, group, **attr):
-        self.social_graph.add_edge(group, player, **attr)
-        self.update_edge_dict(group, player)
+        self.add_relation(group, player, **attr)
         player.join_group(group, list(attr.keys()))
         group.add_player(player)
 
     def quit_group(self, player, group, attributes=None):
         if attributes is None:
             attributes = []
+        u, v = self.node_ids[group], self.node_ids[player]
         if attributes:
-            d = self.social_graph.edges[group, player]
+            d = self.graph.edge(u, v)
             for attribute in attributes:
-                del d[attribute]
-                del d['_dict_view']['attributes'][attribute]
-            if len(d) == 1:
-                assert '_dict_view' in d
-                self.social_graph.remove_edge(group, player)
+                self.graph.remove_edge_attr(u, v, attribute)
+            if not d:
+                self.graph.remove_edge(u, v)
                 player.quit_group(group, attributes)
                 group.remove_player(player)
         else:
-            self.social_graph.remove_edge(group, player)
+            self.graph.remove_edge(u, v)
             player.quit_group(group)
             group.remove_player(player)
 
@@ -91,24 +140,24 @@ class Social:
                     self.merge_two_groups(self, groups[0], group, attribute)
 
     def merge_two_groups(self, group_1, group_2, attribute):
-        for player in self.social_graph.successors(group_2):
-            if self.social_graph.has_edge(group_1, player):
-                edge_attr = self.social_graph[group_1][player]
-                if edge_attr != self.social_graph[group_2][player]:
+        for player in self.successors(group_2):
+            if self.has_relation(group_1, player):
+                edge_attr = self.get_relation(group_1, player)
+                if edge_attr != self.get_relation(group_2, player):
                     return False
-            value = self.social_graph[group_2, player][attribute]
+            value = self.get_relation(group_2, player)[attribute]
             self.quit_group(player, group_2, attributes=[attribute])
             self.join_group(player, group_1, **{attribute: value})
-        if not self.social_graph.successors(group_2):
+        if not self.successors(group_2):
             self.remove_group(group_2)
         return True
 
     def find_matching_pairs(self):
         pairs = []
-        for node1, node2 in self.social_graph.edges():
-            if self.social_graph.has_edge(node2, node1):
-                edge1_condition = self.social_graph[node1][node2].get('matching_condition', None)
-                edge2_condition = self.social_graph[node2][node1].get('matching_condition', None)
+        for node1, node2, attr in self.relations():
+            if self.has_relation(node2, node1):
+                edge1_condition = attr.get('matching_condition', None)
+                edge2_condition = self.get_relation(node2, node1).get('matching_condition', None)
                 if edge1_condition == edge2_condition:
                     pairs.append((node1, node2))
 
@@ -119,16 +168,11 @@ class Social:
             groups = player.groups.copy()
             for group in groups:
                 self.quit_group(player, group)
-        self.social_graph = nx.DiGraph()
-        for player in self.players:
-            self.social_graph.add_node(player)
-            self.social_graph.nodes[player].update(
-                {
-                    'type': 'player',
-                    'id': player._id,
-                }
-            )
-            self.social_graph.nodes[player]['_dict_view'] = self.node_to_dict(self.social_graph.nodes[player])
+        # Clear through the graph operations, so that the change log stays continuous
+        for group in list(self.group_dict.values()):
+            self._remove_node(group)
+        for u, v, _ in list(self.graph.edges()):
+            self.graph.remove_edge(u, v)
         self.group_dict = {}
         self.next_group_id = 0
         self.obs = {}
@@ -154,36 +198,119 @@ class Social:
             for _id, a in zip(ids, attr_list):
                 self.join_group(self.players[_id], group, **a)
 
+    # Queries over node objects (players and groups)
+    def nodes(self):
+        return [self.node_objects[u] for u in self.graph.nodes]
+
+    def node_type(self, node):
+        return self.graph.nodes[self.node_ids[node]]['type']
+
+    def has_relation(self, player_from, player_to):
+        return self.graph.has_edge(self.node_ids[player_from], self.node_ids[player_to])
+
+    def get_relation(self, player_from, player_to):
+        # Attribute dict of the edge; change it through `add_relation` / `remove_relation` only
+        return self.graph.edge(self.node_ids[player_from], self.node_ids[player_to])
+
+    def relations(self, attribute=None):
+        # (from, to, attributes) of all edges, or of the edges holding `attribute`
+        edges = self.graph.edges() if attribute is None else self.graph.edges_with(attribute)
+        for u, v, data in edges:
+            yield self.node_objects[u], self.node_objects[v], data
+
+    def in_relations(self, node):
+        for u, data in self.graph.pred[self.node_ids[node]].items():
+            yield self.node_objects[u], node, data
+
+    def out_relations(self, node):
+        for v, data in self.graph.succ[self.node_ids[node]].items():
+            yield node, self.node_objects[v], data
+
+    def successors(self, node):
+        return [self.node_objects[v] for v in self.graph.succ[self.node_ids[node]]]
+
+    def predecessors(self, node):
+        return [self.node_objects[u] for u in self.graph.pred[self.node_ids[node]]]
+
     def get_node_list(self):
-        return [data for _, data in self.social_graph.nodes(data='_dict_view')]
-    
+        self._update_lists()
+        return list(self._node_list)
+
     def get_edge_list(self):
-        return [data for _, _, data in self.social_graph.edges(data='_dict_view')]
-        
-    def update_edge_dict(self, u, v):
-        self.social_graph.edges[u, v]['_dict_view'] = self.edge_to_dict(
-            u, v, {k: v for k, v in self.social_graph.edges[u, v].items() if k != '_dict_view'}
-        )
-        
+        self._update_lists()
+        return list(self._edge_list)
+
+    def _update_lists(self):
+        # The dict views are rebuilt only when the graph changed since the last call
+        if self._list_version == self.graph.version:
+            return
+        self._node_list = [self.node_to_dict(attr) for attr in self.graph.nodes.values()]
+        self._edge_list = [self.edge_to_dict(u, v, dict(data)) for u, v, data in self.graph.edges()]
+        self._list_version = self.graph.version
+
+    def get_snapshot(self):
+        return {
+            "version": self.graph.version,
+            "nodes": self.get_node_list(),
+            "edges": self.get_edge_list(),
+        }
+
+    def get_changes(self, since):
+        # Net changes of the node / edge dict views since version `since`, or None if they are
+        # no longer logged (take a snapshot then). Apply removals before additions / updates:
+        # a group id can be reused by a new group after the old one was removed.
+        self._prune_node_attrs()
+        entries = self.graph.changes_since(since)
+        if entries is None:
+            return None
+        nodes = {}
+        edges = {}
+        for u, v in entries:
+            if v is None:
+                nodes[u] = None
+            else:
+                edges[(u, v)] = None
+        changes = {
+            "since": since,
+            "version": self.graph.version,
+            "nodes_removed": [],
+            "nodes_added": [],
+            "edges_removed": [],
+            "edges_updated": [],
+        }
+        for u in nodes:
+            if u in self.graph.nodes:
+                changes["nodes_added"].append(self.node_to_dict(self._node_attrs[u]))
+            else:
+                changes["nodes_removed"].append(self.node_to_dict(self._node_attrs[u]))
+        for u, v in edges:
+            if u in self.graph.nodes and v in self.graph.nodes and self.graph.has_edge(u, v):
+                changes["edges_updated"].append(self.edge_to_dict(u, v, dict(self.graph.edge(u, v))))
+            else:
+                edge = self.edge_to_dict(u, v, {})
+                del edge["attributes"]
+                changes["edges_removed"].append(edge)
+        return changes
+
     def node_to_dict(self, attr):
         return {
                 "type": attr["type"],
                 attr["type"]: {"id": attr["id"]},
             }
-        
+
     def edge_to_dict(self, u, v, attr):
         return {
             "from": {
-                "type": self.social_graph.nodes[u]["type"], 
-                "id": self.social_graph.nodes[u]["id"],
+                "type": self._node_attrs[u]["type"],
+                "id": self._node_attrs[u]["id"],
             },
             "to": {
-                "type": self.social_graph.nodes[v]["type"], 
-                "id": self.social_graph.nodes[v]["id"],
+                "type": self._node_attrs[v]["type"],
+                "id": self._node_attrs[v]["id"],
             },
             "attributes": attr,
         }
-            
+
     @property
     def observation(self):
         # TODO
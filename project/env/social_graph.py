@@ -0,0 +1,128 @@
+from operator import itemgetter
+
+
+class SocialGraph:
+    # Directed graph over integer node ids.
+    # Edges are attribute dicts shared by `succ[u][v]` and `pred[v][u]`, and every attribute
+    # has an edge table {(u, v): None} listing the edges that hold it, in insertion order.
+    # Every change appends the touched node (u, None) or edge (u, v) to `log`; the version of
+    # the graph is the number of changes so far.
+    def __init__(self, max_log_length=100000):
+        self.nodes = {}  # node id -> node attributes
+        self.succ = {}  # node id -> {successor id: edge attributes}
+        self.pred = {}  # node id -> {predecessor id: edge attributes}
+        self.attr_edges = {}  # attribute -> {(u, v): None}
+        self.next_node_id = 0
+        self.log = []
+        self.log_start = 0  # version of the first change still in `log`
+        self.max_log_length = max_log_length
+
+    def add_node(self, **attr):
+        u = self.next_node_id
+        self.next_node_id += 1
+        self.nodes[u] = attr
+        self.succ[u] = {}
+        self.pred[u] = {}
+        self._record(u, None)
+        return u
+
+    def remove_node(self, u):
+        for v in list(self.succ[u]):
+            self.remove_edge(u, v)
+        for w in list(self.pred[u]):
+            self.remove_edge(w, u)
+        del self.nodes[u]
+        del self.succ[u]
+        del self.pred[u]
+        self._record(u, None)
+
+    def has_edge(self, u, v):
+        return v in self.succ[u]
+
+    def edge(self, u, v):
+        return self.succ[u][v]
+
+    def add_edge(self, u, v, **attr):
+        data = self.succ[u].get(v)
+        if data is None:
+            data = {}
+            self.succ[u][v] = data
+            self.pred[v][u] = data
+        for key, value in attr.items():
+            data[key] = value
+            self.attr_edges.setdefault(key, {})[(u, v)] = None
+        self._record(u, v)
+
+    def remove_edge(self, u, v):
+        data = self.succ[u].pop(v)
+        del self.pred[v][u]
+        for key in data:
+            del self.attr_edges[key][(u, v)]
+        self._record(u, v)
+
+    def remove_edge_attr(self, u, v, key):
+        del self.succ[u][v][key]
+        del self.attr_edges[key][(u, v)]
+        self._record(u, v)
+
+    def edges(self):
+        # (u, v, attributes) of all edges, ordered by source node and then by insertion
+        for u, nbrs in self.succ.items():
+            for v, data in nbrs.items():
+                yield u, v, data
+
+    def edges_with(self, key):
+        # (u, v, attributes) of the edges holding `key`, ordered by source node like `edges`,
+        # skipping the ones changed meanwhile
+        for u, v in sorted(self.attr_edges.get(key, ()), key=itemgetter(0)):
+            data = self.succ.get(u, {}).get(v)
+            if data is not None and key in data:
+                yield u, v, data
+
+    def snapshot(self):
+        return {
+            'nodes': {u: dict(attr) for u, attr in self.nodes.items()},
+            'edges': [(u, v, dict(data)) for u, v, data in self.edges()],
+            'pred': {v: list(nbrs) for v, nbrs in self.pred.items()},
+            'attr_edges': {key: dict(edges) for key, edges in self.attr_edges.items()},
+            'next_node_id': self.next_node_id,
+            'version': self.version,
+        }
+
+    def restore(self, state):
+        self.nodes = {u: dict(attr) for u, attr in state['nodes'].items()}
+        self.succ = {u: {} for u in self.nodes}
+        for u, v, data in state['edges']:
+            self.succ[u][v] = dict(data)
+        # Same predecessor order as when the snapshot was taken
+        self.pred = {v: {u: self.succ[u][v] for u in nbrs} for v, nbrs in state['pred'].items()}
+        self.attr_edges = {key: dict(edges) for key, edges in state['attr_edges'].items()}
+        self.next_node_id = state['next_node_id']
+        # Versions past the snapshot may have been handed out already: continue after them with
+        # an empty log, so that any earlier version falls back to a snapshot
+        self.log_start = max(self.version, state['version']) + 1
+        self.log = []
+
+    @property
+    def version(self):
+        return self.log_start + len(self.log)
+
+    def changes_since(self, version):
+        # Nodes / edges touched since `version`, or None if the log does not reach back that far
+        if version < self.log_start:
+            return None
+        return self.log[version - self.log_start:]
+
+    def truncate(self, version):
+        # Drop the changes before `version`, once no one asks for them any more
+        drop = min(version, self.version) - self.log_start
+        if drop > 0:
+            del self.log[:drop]
+            self.log_start += drop
+
+    def _record(self, u, v):
+        self.log.append((u, v))
+        if len(self.log) > self.max_log_length:
+            drop = len(self.log) // 2
+            del self.log[:drop]
+            self.log_start += drop
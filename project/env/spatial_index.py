@@ -0,0 +1,103 @@
+import bisect
+
+import numpy as np
+
+
+class SpatialIndex:
+    # Players by cell and by bucket of `bucket_size` x `bucket_size` cells, updated on moves.
+    # Players are referred to by their index in `players`. If several players share a cell,
+    # the last one in `players` is the one found there.
+    def __init__(self, size_x, size_y, bucket_size=8):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.bucket_size = bucket_size
+        self.players = []
+        self.cells = {}  # (x, y) -> [player index, ...] in order
+        self.buckets = {}  # (bucket x, bucket y) -> {player index, ...}
+        self.grid = np.zeros((size_x, size_y), dtype=np.int64)  # index + 1 of the player found at each cell
+
+    def load(self, players):
+        self.players = list(players)
+        self.cells = {}
+        self.buckets = {}
+        self.grid[:] = 0
+        for i, player in enumerate(self.players):
+            self._add(i, player.position)
+
+    def move_players(self, prev_positions, players):
+        for i, (prev, player) in enumerate(zip(prev_positions, players)):
+            if prev != player.position:
+                self._remove(i, prev)
+                self._add(i, player.position)
+
+    def get(self, position):
+        indices = self.cells.get(tuple(position))
+        return self.players[indices[-1]] if indices else None
+
+    def _add(self, i, position):
+        x, y = position
+        indices = self.cells.setdefault((x, y), [])
+        bisect.insort(indices, i)
+        self.grid[x, y] = indices[-1] + 1
+        self.buckets.setdefault(self._bucket(x, y), set()).add(i)
+
+    def _remove(self, i, position):
+        x, y = position
+        indices = self.cells[(x, y)]
+        indices.remove(i)
+        if indices:
+            self.grid[x, y] = indices[-1] + 1
+        else:
+            del self.cells[(x, y)]
+            self.grid[x, y] = 0
+        bucket = self.buckets[self._bucket(x, y)]
+        bucket.discard(i)
+
+    def _bucket(self, x, y):
+        return x // self.bucket_size, y // self.bucket_size
+
+    def visible_players(self, viewers):
+        # {viewer.name: [player, ...]} of the other players found in the FOV of each viewer,
+        # ordered by x and then y offset from the FOV corner (as a scan of the FOV would).
+        # Each viewer looks into the buckets overlapping its FOV if they hold fewer players than
+        # the FOV has cells, else all viewers left with the same FOV scan `grid` in one gather.
+        visible = {}
+        scans = {}
+        for viewer in viewers:
+            h, v = viewer.fov
+            width, height = 2 * h + 1, 2 * v + 1
+            if width <= self.size_x and height <= self.size_y:
+                bucket_xs = np.unique((np.arange(viewer.x - h, viewer.x + h + 1) % self.size_x) // self.bucket_size)
+                bucket_ys = np.unique((np.arange(viewer.y - v, viewer.y + v + 1) % self.size_y) // self.bucket_size)
+                buckets = [self.buckets.get((bx, by), ()) for bx in bucket_xs.tolist() for by in bucket_ys.tolist()]
+                if sum(len(bucket) for bucket in buckets) < width * height:
+                    visible[viewer.name] = self._query_buckets(viewer, buckets)
+                    continue
+            scans.setdefault((h, v), []).append(viewer)
+        for (h, v), group in scans.items():
+            xs = np.array([viewer.x for viewer in group])
+            ys = np.array([viewer.y for viewer in group])
+            rows = (xs[:, np.newaxis] + np.arange(-h, h + 1)) % self.size_x
+            cols = (ys[:, np.newaxis] + np.arange(-v, v + 1)) % self.size_y
+            windows = self.grid[rows[:, :, np.newaxis], cols[:, np.newaxis, :]]
+            for viewer, window in zip(group, windows):
+                visible[viewer.name] = [
+                    self.players[i - 1] for i in window[window > 0].tolist()
+                    if self.players[i - 1].name != viewer.name
+                ]
+        return visible
+
+    def _query_buckets(self, viewer, buckets):
+        h, v = viewer.fov
+        found = []
+        for bucket in buckets:
+            for i in bucket:
+                player = self.players[i]
+                if player.name == viewer.name or self.cells[player.position][-1] != i:
+                    continue
+                dx = (player.x - viewer.x + h) % self.size_x
+                dy = (player.y - viewer.y + v) % self.size_y
+                if dx <= 2 * h and dy <= 2 * v:
+                    found.append((dx, dy, player))
+        found.sort(key=lambda item: item[:2])
+        return [player for _, _, player in found]
@@ -1,5 +1,6 @@
 import random
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 BLANK = 0
 BLOCK = 1
@@ -12,14 +13,24 @@ UPPER_LEFT = UP + LEFT
 UPPER_RIGHT = UP + RIGHT
 LOWER_LEFT = DOWN + LEFT
 LOWER_RIGHT = DOWN + RIGHT
+# Rows of tokens converted at a time for array maps
+TILE_ROWS = 256
+# Maps of up to this many cells keep a set of their blank cells to sample from, which draws the
+# same layouts for a given seed as before the compact sampler
+SET_SAMPLING_CELLS = 1 << 16
 
 
 class WorldMap:
     def __init__(
         self,
-        # [[token_row_0_col_0, token_row_0_col_1, ...], [token_row_1_col_0, ...]]
+        # [[token_row_0_col_0, token_row_0_col_1, ...], [token_row_1_col_0, ...]], or a
+        # (size_y, size_x) string array of the tokens, e.g. memory-mapped by `load`
         token_array,
         token_lookup_table=None,
+        # Map data of `token_array` if already known, wrap-padded by `padding` (pad_x, pad_y),
+        # e.g. shared by `MapStore`
+        map_data=None,
+        padding=(0, 0),
     ):
         if token_lookup_table is None:
             self.token_lookup_table = self._generate_token_lookup_table(token_array)
@@ -27,12 +38,26 @@ class WorldMap:
             self.token_lookup_table = token_lookup_table
         self.block_lookup_table = {k: v for k, v in self.token_lookup_table.items() if v == BLOCK}
         self.token_array = token_array
-        self.map_data = [list(map(self.token_lookup_table.get, row)) for row in self.token_array]
-        assert np.all(self.map_data != None)
-        self.map_data = np.array(self.map_data)
+        # Wrap-padded copy of `map_data`, so that toroidal windows are slices of it.
+        # Grown by `pad` as needed and kept in sync by `add_block`.
+        self.pad_x, self.pad_y = padding
+        if map_data is not None:
+            # A view of the given padded data, which is then used as is
+            self.padded_data = map_data
+            self.map_data = map_data[self.pad_y:map_data.shape[0] - self.pad_y, self.pad_x:map_data.shape[1] - self.pad_x]
+        elif isinstance(token_array, np.ndarray):
+            self.map_data = self._lookup_tiles(token_array)
+        else:
+            self.map_data = [list(map(self.token_lookup_table.get, row)) for row in self.token_array]
+            self.map_data = np.array(self.map_data, dtype=np.int8)
+        if map_data is None:
+            self._update_padding()
         self.size_y, self.size_x = self.map_data.shape
-        # Blank positions
-        self.blank_pos = set(map(tuple, np.argwhere(self.map_data.T == BLANK).tolist()))
+        self.blank_num = int(np.count_nonzero(self.map_data == BLANK))
+        self.blank_pos = self._blank_set()
+        # Blocks added since construction [(x, y, previous value, previous token), ...], undone
+        # by `reset`
+        self._added_blocks = []
 
     @property
     def shape(self):
@@ -42,7 +67,93 @@ class WorldMap:
     def observation(self):
         return self.map_data
 
-    def add_block(self, position):
+    @classmethod
+    def load(cls, file_path, token_lookup_table=None):
+        # Map saved by `save`, memory-mapped: the tokens are read from the file as needed, and
+        # only the cells changed by `add_block` are copied into memory
+        return cls(np.load(file_path, mmap_mode='c'), token_lookup_table=token_lookup_table)
+
+    def save(self, file_path):
+        # Binary map file (.npy) of the tokens
+        np.save(file_path, np.asarray(self.token_array, dtype=str))
+
+    def reset(self):
+        # Remove the blocks added since construction
+        while self._added_blocks:
+            self._set_cell(*self._added_blocks.pop())
+        # A new set, as a new map would have: the order of a set depends on its history
+        self.blank_pos = self._blank_set()
+
+    def _blank_set(self):
+        if self.size_x * self.size_y > SET_SAMPLING_CELLS:
+            return None
+        return set(map(tuple, np.argwhere(self.map_data.T == BLANK).tolist()))
+
+    def pad(self, pad_x, pad_y):
+        # Make sure that `padded_data` has at least this padding
+        if pad_x > self.pad_x or pad_y > self.pad_y:
+            self.pad_x, self.pad_y = max(pad_x, self.pad_x), max(pad_y, self.pad_y)
+            self._update_padding()
+
+    def _update_padding(self):
+        self.padded_data = np.pad(self.map_data, ((self.pad_y, self.pad_y), (self.pad_x, self.pad_x)), mode='wrap')
+
+    def add_block(self, position, token=None, rng=random):
+        # Returns the token of the block: `token`, or else one of the neighbouring blocks
+        if token is None:
+            token = self._choose_block_token(position, rng)
+        x, y = position
+        self._added_blocks.append((x, y, self.map_data[y, x], self.token_array[y][x]))
+        self._set_cell(x, y, BLOCK, token)
+        return token
+
+    def _set_cell(self, x, y, value, token):
+        self.blank_num += int(value == BLANK) - int(self.map_data[y, x] == BLANK)
+        if self.blank_pos is not None:
+            if value == BLANK:
+                self.blank_pos.add((x, y))
+            else:
+                self.blank_pos.discard((x, y))
+        self.map_data[y, x] = value
+        # Every copy of (x, y) in the padded map
+        rows = np.arange((y + self.pad_y) % self.size_y, self.padded_data.shape[0], self.size_y)
+        cols = np.arange((x + self.pad_x) % self.size_x, self.padded_data.shape[1], self.size_x)
+        self.padded_data[np.ix_(rows, cols)] = value
+        self.token_array[y][x] = token
+
+    def sample_blank(self, k, exclude=None, rng=random):
+        # `k` distinct blank positions [(x, y), ...] outside of `exclude`, drawn uniformly.
+        # Small maps draw from `blank_pos` (a copy of it if anything is excluded), exactly as
+        # the set-based sampler did. Larger maps draw cells at random until enough are blank
+        # when blanks are common, else draw from the list of blank cells.
+        if self.blank_pos is not None:
+            blank_pos = self.blank_pos
+            if exclude is not None:
+                blank_pos = blank_pos.copy()
+                for pos in exclude:
+                    blank_pos.discard(tuple(pos))
+            return rng.sample(list(blank_pos), k)
+        if k == 0:
+            return []
+        exclude = set() if exclude is None else set(map(tuple, exclude))
+        available = self.blank_num - sum(1 for x, y in exclude if self.map_data[y, x] == BLANK)
+        if k > available:
+            raise ValueError('Sample larger than the blank cells')
+        cell_num = self.size_x * self.size_y
+        if 2 * k <= available and 4 * available >= cell_num:
+            positions = {}
+            while len(positions) < k:
+                x, y = divmod(rng.randrange(cell_num), self.size_y)
+                if self.map_data[y, x] == BLANK and (x, y) not in exclude:
+                    positions[(x, y)] = None
+            return list(positions)
+        blank_pos = np.argwhere(self.map_data.T == BLANK)
+        if exclude:
+            excluded = np.array([x * self.size_y + y for x, y in exclude], dtype=np.int64)
+            blank_pos = blank_pos[~np.isin(blank_pos[:, 0] * self.size_y + blank_pos[:, 1], excluded)]
+        return [tuple(blank_pos[i].tolist()) for i in rng.sample(range(len(blank_pos)), k)]
+
+    def _choose_block_token(self, position, rng):
         choices = set()
         for delta_pos in [UP, DOWN, LEFT, RIGHT, UPPER_LEFT, UPPER_RIGHT, LOWER_LEFT, LOWER_RIGHT]:
             x = (position[0] + delta_pos[0]) % self.size_x
@@ -51,16 +162,12 @@ class WorldMap:
                 choices.add(self.token_array[y][x])
         if not choices:
             choices = set(self.block_lookup_table.keys())
-        token = random.choice(list(choices))
-        x, y = position
-        self.map_data[y, x] = BLOCK
-        self.token_array[y][x] = token
-        # Remove (x, y) from blanks if existed
-        self.blank_pos.discard((x, y))
+        return rng.choice(list(choices))
 
-    def add_blocks(self, positions):
-        for pos in positions:
-            self.add_block(pos)
+    def add_blocks(self, positions, tokens=None, rng=random):
+        if tokens is None:
+            tokens = [None] * len(positions)
+        return [self.add_block(pos, token, rng) for pos, token in zip(positions, tokens)]
 
     def is_block(self, position):
         return self.map_data[position[1], position[0]] == BLOCK
@@ -70,14 +177,48 @@ class WorldMap:
         cols = np.arange(x_start, x_end) % self.size_x
         return self.map_data[rows][:, cols]
 
+    def window(self, position, fov):
+        # Read-only view of the toroidal window centered on `position`, same as
+        # `grids(x - h, x + h + 1, y - v, y + v + 1)`
+        x, y = position
+        h, v = fov
+        self.pad(h, v)
+        y_start = y - v + self.pad_y
+        x_start = x - h + self.pad_x
+        window = self.padded_data[y_start:y_start + 2 * v + 1, x_start:x_start + 2 * h + 1]
+        window.flags.writeable = False
+        return window
+
+    def windows(self, positions, fov):
+        # (n, 2v + 1, 2h + 1) windows centered on each of `positions`, in one gather
+        h, v = fov
+        self.pad(h, v)
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        views = sliding_window_view(self.padded_data, (2 * v + 1, 2 * h + 1))
+        return views[positions[:, 1] - v + self.pad_y, positions[:, 0] - h + self.pad_x]
+
     def pretty_print(self):
         s = '\n'.join([''.join(row) for row in self.token_array])
         print(s)
 
+    def _lookup_tiles(self, token_array):
+        # Map data of a token array, converted a tile of rows at a time
+        map_data = np.empty(token_array.shape, dtype=np.int8)
+        for start in range(0, token_array.shape[0], TILE_ROWS):
+            tokens, inverse = np.unique(token_array[start:start + TILE_ROWS], return_inverse=True)
+            values = np.array([self.token_lookup_table[token] for token in tokens.tolist()], dtype=np.int8)
+            map_data[start:start + TILE_ROWS] = values[inverse].reshape(-1, token_array.shape[1])
+        return map_data
+
     def _generate_token_lookup_table(self, token_array):
         # All tokens are blocks except SPACE
         # The length of all tokens must be same
-        token_set = set().union(*token_array)
+        if isinstance(token_array, np.ndarray):
+            token_set = set()
+            for start in range(0, token_array.shape[0], TILE_ROWS):
+                token_set.update(np.unique(token_array[start:start + TILE_ROWS]).tolist())
+        else:
+            token_set = set().union(*token_array)
         token_lookup_table = {t: BLOCK for t in token_set}
         token_lookup_table[' ' * len(token_array[0][0])] = BLANK
         return token_lookup_table
@@ -9,6 +9,10 @@ MAX_ITEM_NUM = 32767
 WEIGHT = 'division_weight'
 
 class ContractAgent:
+    # Observation modes `update_obs` reads
+    obs_modes = ('dict', 'tensor')
+    grid_view = 'fov'
+
     def __init__(self, _id, env_info, task_info):
         self.state = State(_id, env_info, task_info)
         self.action = Action(_id, env_info, task_info)
@@ -55,6 +59,13 @@ class ContractAgent:
         obs
     ):
         update_obs = {}
+        if 'grid_observation' in obs:
+            for key in ['grid_observation', 'inventory', 'communication', 'social_state', 'time']:
+                update_obs[key] = obs[key]
+            update_obs['player_id'] = np.zeros((self.state.player_num + self.group_num), dtype=np.int8)
+            update_obs['player_id'][self.state._id] = 1
+            update_obs['action_mask'] = self.get_action_mask(int(obs['time'][0]), obs['action_mask'])
+            return update_obs
         self.state.update_my_pos(obs['Player']['position'])
         player_layer = self.state.player_toarray(obs['Map']['players'])
         block_layer = np.array(obs['Map']['block_grids'])[np.newaxis, :, :]
@@ -63,11 +74,11 @@ class ContractAgent:
         update_obs['grid_observation'] = np.concatenate((player_layer, block_layer, event_layer, resource_layer), axis=0)
         update_obs['inventory'] = self.state.inventory_toarray(obs['Player']['inventory'])
         update_obs['communication'] = self.state.words_toarray(obs['Social']['communications'])
-        update_obs['social_state'] = self.state.social_state2adj(obs['Social']['global']['edges'])
+        update_obs['social_state'] = self.state.update_social_state(obs['Social'])
         update_obs['time'] = np.array([obs['step_id']])
         update_obs['player_id'] = np.zeros((self.state.player_num + self.group_num), dtype=np.int8)
         update_obs['player_id'][self.state._id] = 1
-        update_obs['action_mask'] = self.get_action_mask(update_obs['grid_observation'], update_obs['inventory'], obs['step_id'])
+        update_obs['action_mask'] = self.get_action_mask(obs['step_id'], obs['action_mask'])
 
         return update_obs
         
@@ -119,7 +130,7 @@ class ContractAgent:
     def get_action(self):
         return self.action.get_action()
     
-    def get_action_mask(self, grid_obs, inventory, time):
+    def get_action_mask(self, time, physical_action_mask):
         action_mask = np.zeros(6 + 2 * self.state.resource_num + self.group_num)
         if time < self.negotiation_round * self.state.player_num:
             if self.state._id == self.turn_order[time % self.state.player_num]:
@@ -127,18 +138,8 @@ class ContractAgent:
             else:
                 action_mask[4] = 1
         else:
-            player_layer = grid_obs[0]
-            my_pos = np.where(player_layer == self.state._id + 1)
-            my_pos = np.array([my_pos[0][0], my_pos[1][0]])
-            event_here = grid_obs[2: 2 + self.state.resource_num, my_pos[0], my_pos[1]]
-            resource_here = grid_obs[2 + self.state.resource_num: 2 + 2 * self.state.resource_num, my_pos[0], my_pos[1]]
-            pick_mask = np.logical_and(resource_here > 0, inventory < self.state.my_resource_capacity).astype(np.int8)
-            dump_mask = (inventory > 0).astype(np.int8)
-            action_mask[:5] = 1
-            if np.any(event_here) and (event_here + inventory <= self.state.my_resource_capacity).all():
-                action_mask[5] = 1
-            action_mask[6: 6 + self.state.resource_num] = pick_mask
-            action_mask[6 + self.state.resource_num: 6 + 2 * self.state.resource_num] = dump_mask
+            # Physical actions as computed by the game
+            action_mask[:len(physical_action_mask)] = physical_action_mask
         return action_mask
     
     def get_turn_order(self, seed):
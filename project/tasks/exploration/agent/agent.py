@@ -8,6 +8,10 @@ MAX_ITEM_NUM = 32767
 WEIGHT = 'division_weight'
 
 class ExplorationAgent:
+    # Observation modes `update_obs` reads
+    obs_modes = ('dict', 'tensor')
+    grid_view = 'map'
+
     def __init__(self, _id, env_info, task_info):
         self.state = State(_id, env_info, task_info)
         self.reward = Reward(_id, env_info, task_info)
@@ -51,12 +55,20 @@ class ExplorationAgent:
         obs
     ):
         update_obs = {}
-        shared_obs, sharing_player, sharing_block = self.state.sharing_obs(obs)
-        update_obs = self.state.process_obs(shared_obs, sharing_player, sharing_block)
+        if 'grid_observation' in obs:
+            for key in ['grid_observation', 'inventory', 'communication', 'social_state', 'time']:
+                update_obs[key] = obs[key]
+            action_mask = np.ones(self.action_dim, dtype=np.int8)
+            action_mask[:len(obs['action_mask'])] = obs['action_mask']
+            self.social_graph_edges = obs['social_edges']
+        else:
+            shared_obs, sharing_player, sharing_block = self.state.sharing_obs(obs)
+            update_obs = self.state.process_obs(shared_obs, sharing_player, sharing_block)
+            action_mask = self.get_action_mask(obs['action_mask'])
+            self.social_graph_edges = obs['Social']['global']['edges']
         update_obs['player_id'] = np.zeros((self.state.player_num + self.group_num), dtype=np.int8)
         update_obs['player_id'][self.state._id] = 1
-        update_obs['action_mask'] = self.get_action_mask(update_obs['grid_observation'], update_obs['inventory'])
-        self.social_graph_edges = obs['Social']['global']['edges']
+        update_obs['action_mask'] = action_mask
         return update_obs
     
     def update_policy(
@@ -116,20 +128,10 @@ class ExplorationAgent:
     def get_action(self):
         return self.action.get_action()
 
-    def get_action_mask(self, grid_obs, inventory):
+    def get_action_mask(self, physical_action_mask):
+        # Physical actions as computed by the game, social ones always open
         action_mask = np.zeros(self.action_dim)
-        player_layer = grid_obs[0]
-        my_pos = np.where(player_layer == self.state._id + 1)
-        my_pos = np.array([my_pos[0][0], my_pos[1][0]])
-        event_here = grid_obs[2: 2 + self.state.resource_num, my_pos[0], my_pos[1]]
-        resource_here = grid_obs[2 + self.state.resource_num: 2 + 2 * self.state.resource_num, my_pos[0], my_pos[1]]
-        pick_mask = np.logical_and(resource_here > 0, inventory < self.state.my_resource_capacity).astype(np.int8)
-        dump_mask = (inventory > 0).astype(np.int8)
-        action_mask[:5] = 1
-        if np.any(event_here) and (event_here + inventory <= self.state.my_resource_capacity).all():
-            action_mask[5] = 1
-        action_mask[6: 6 + self.state.resource_num] = pick_mask
-        action_mask[6 + self.state.resource_num: 6 + 2 * self.state.resource_num] = dump_mask
+        action_mask[:len(physical_action_mask)] = physical_action_mask
         action_mask[-(2 * self.state.player_num + self.group_num):] = 1
         return action_mask
     
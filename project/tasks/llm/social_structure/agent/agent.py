@@ -316,9 +316,10 @@ class PhysicalAgent(BaseAgent):
         llm_obs['current_pos'] = observation["Player"]['position']
         llm_obs['inventory'] = observation["Player"]['inventory']
 
-        llm_obs['resource'] = observation["Map"]['resources']
-        llm_obs['event'] = observation["Map"]['events']
-        llm_obs['people'] = observation["Map"]['players']
+        # Copies, the map views are shared with the observations of other players
+        llm_obs['resource'] = list(observation["Map"]['resources'])
+        llm_obs['event'] = list(observation["Map"]['events'])
+        llm_obs['people'] = list(observation["Map"]['players'])
 
         for key in observation["Social"]['sharings'].keys():
             sharing = observation["Social"]['sharings'][key]
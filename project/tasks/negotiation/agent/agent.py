@@ -5,6 +5,9 @@ from .mdp.reward import Reward
 from gymnasium.spaces import Discrete
 
 class NegotiationAgent:
+    obs_modes = ('dict',)
+    grid_view = 'fov'
+
     def __init__(self, _id, env_info, task_info):
         self._id = env_info['_id']
         self.claim_proposal_interval = task_info.negotiation['claim_proposal_interval']
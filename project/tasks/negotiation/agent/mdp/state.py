@@ -48,6 +48,9 @@ class State:
         })
 
         self.obs_dict = self.observation_space.sample()
+        # Social graph kept in sync with the change log of the environment
+        self._social_graph = None
+        self._social_version = None
 
     def update(self, obs):
         self._my_pos = obs['Player']['position']
@@ -105,7 +108,7 @@ class State:
 
         ''' social_state '''
         # social_graph = obs['Social']['social_graph']
-        social_graph = self.social_state2graph(obs["Social"]['global']['edges'])
+        social_graph = self.update_social_graph(obs["Social"])
         # self.obs_dict['social_state'] = self._get_player_adjacency_matrix(social_graph)
 
         ''' time '''
@@ -117,7 +120,7 @@ class State:
         self.obs_dict['player_id'][self._id] = 1
 
         ''' action_mask '''
-        action_mask = self._get_action_mask(social_graph, obs['step_id'], self.obs_dict['grid_observation'], self.obs_dict['inventory'])
+        action_mask = self._get_action_mask(social_graph, obs['step_id'], obs['action_mask'])
         # print(f"action mask: {action_mask}")
         self.obs_dict['action_mask'] = action_mask
 
@@ -175,6 +178,38 @@ class State:
             G.add_edge(from_name, to_name, **edge['attributes'])
         return G
     
+    def update_social_graph(self, social_obs):
+        # Same graph as `social_state2graph(social_obs['global']['edges'])`, but patched with the
+        # changes since the previous observation instead of rebuilt when they follow on from it
+        changes = social_obs.get('changes')
+        if self._social_graph is None or changes is None or changes['since'] != self._social_version:
+            self._social_graph = self.social_state2graph(social_obs['global']['edges'])
+        else:
+            G = self._social_graph
+            for edge in changes['edges_removed']:
+                from_name, to_name = self._edge_node_names(edge)
+                if G.has_edge(from_name, to_name):
+                    G.remove_edge(from_name, to_name)
+                    # Only players are kept without edges
+                    for name in (from_name, to_name):
+                        if G.nodes[name]['type'] != 'player' and G.degree(name) == 0:
+                            G.remove_node(name)
+            for edge in changes['edges_updated']:
+                from_name, to_name = self._edge_node_names(edge)
+                for name, node in ((from_name, edge['from']), (to_name, edge['to'])):
+                    if name not in G.nodes:
+                        G.add_node(name, type=node['type'], id=node['id'])
+                if G.has_edge(from_name, to_name):
+                    G[from_name][to_name].clear()
+                G.add_edge(from_name, to_name, **edge['attributes'])
+        self._social_version = social_obs['global'].get('version')
+        return self._social_graph
+
+    def _edge_node_names(self, edge):
+        from_node = edge['from']
+        to_node = edge['to']
+        return f'{from_node["type"]}_{from_node["id"]}', f'{to_node["type"]}_{to_node["id"]}'
+
     def social_state2graph(self, edge_list):
         G = nx.DiGraph()
         for i in range(self.player_num):
@@ -198,7 +233,7 @@ class State:
             inventory[self._resource2id[resource['name']]] += resource['amount']
         return inventory
     
-    def _get_action_mask(self, social_graph, time, grid_obs, inventory):
+    def _get_action_mask(self, social_graph, time, physical_action_mask):
         # edge_list = self.origin_obs['Social']['global']['edges']
         action_mask = np.zeros((self.action_num), dtype=np.int8)
             
@@ -220,18 +255,8 @@ class State:
                         else: # not turn
                             action_mask[4] = 1 # no_act
         else:
-            player_layer = grid_obs[0]
-            my_pos = np.where(player_layer == self._id + 1)
-            my_pos = np.array([my_pos[0][0], my_pos[1][0]])
-            event_here = grid_obs[2: 2 + self.resource_num, my_pos[0], my_pos[1]]
-            resource_here = grid_obs[2 + self.resource_num: 2 + 2 * self.resource_num, my_pos[0], my_pos[1]]
-            pick_mask = np.logical_and(resource_here > 0, inventory < self.my_resource_capacity).astype(np.int8)
-            dump_mask = (inventory > 0).astype(np.int8)
-            action_mask[:5] = 1
-            if np.any(event_here) and (event_here + inventory <= self.my_resource_capacity).all():
-                action_mask[5] = 1
-            action_mask[6: 6 + self.resource_num] = pick_mask
-            action_mask[6 + self.resource_num: 6 + 2 * self.resource_num] = dump_mask
+            # Physical actions as computed by the game
+            action_mask[:len(physical_action_mask)] = physical_action_mask
         
         if np.sum(action_mask) == 0:
             action_mask[4] = 1
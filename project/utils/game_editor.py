@@ -6,6 +6,7 @@ from ..env.event import Event
 from ..env.game import Game
 from ..env.player import Player
 from ..env.resource import Resource
+from ..env.resource_grid import ResourceGrid
 from ..env.social import Social
 from ..env.group import Group
 from ..env.world_map import WorldMap
@@ -26,49 +27,34 @@ NAME_LIST = ['Adam', 'Buford', 'Cindy', 'Dax', 'Eva', 'Fate', 'Gustav', 'Hampton
 
 
 class GameEditor:
-    def __init__(self, config):
+    def __init__(self, config, map_store=None):
         self.config = config
+        # Shared copies of the map files (see `MapStore`), or None to load them per game
+        self.map_store = map_store
         self.world_map = None
+        self._template = None
         # Load default config
 
-    def generate_game(self):
-        world_map = self.generate_map()
-        resources = self.generate_resources(world_map)
-        events = self.generate_events(world_map)
-        players = self.generate_players(world_map)
-        social = self.generate_social(players)
-        game = Game(
-            world_map=world_map,
-            resources=resources,
-            events=events,
-            players=players,
-            social=social,
-            social_schedule=self.config.task.static.social_schedule,
-            negotiation_steps=self.config.task.negotiation_steps,
-            pre_updates=self.config.task.pre_updates,
-            post_updates=self.config.task.post_updates,
-            max_length = self.config.task.max_length,
-        )
-        return game
+    @property
+    def template(self):
+        # Compiled once per config: everything about a game that does not change between episodes
+        self.compile_template()
+        return self._template
 
-    def generate_map(self):
-        # Base
-        base_map_config = self.config['task']['base_map']
-        base_map_init_rule = base_map_config['init_rule']
-        if 'size' in base_map_config:
-            size_x, size_y = base_map_config['size']['x'], base_map_config['size']['y']
-        else:
-            size_x, size_y = None, None
-        file_path = base_map_config.get('file_path')
-        world_map = self._load_map(base_map_init_rule, size_x, size_y, file_path)
+    def compile_template(self):
+        if self._template is None:
+            self._template = self.compile()
+
+    def compile(self):
+        template = {}
         # TODO load static blocks
         config = self.config.task.static.blocks
-        # Load random blocks
+        # Random blocks
         # TODO
         config = self.config.task.random.blocks
-        conf_list = [c for c in config for _ in range(c['repeat'])]
-        block_num = len(conf_list)
-        blank_pos = world_map.blank_pos.copy()
+        template['block_confs'] = [c for c in config for _ in range(c['repeat'])]
+        # Static positions, kept free of random blocks
+        reserved_pos = []
         for k in ['resources', 'events', 'players']:
             k_confs = self.config.task.static.get(k, [])
             for c in k_confs:
@@ -76,14 +62,10 @@ class GameEditor:
                 if not isinstance(positions[0], list):
                     positions = [positions]
                 for pos in positions:
-                    blank_pos.discard(tuple(pos))
-        pos_list = random.sample(list(blank_pos), block_num)
-        world_map.add_blocks(pos_list)
-        return world_map
-
-    def generate_resources(self, world_map):
-        resources = []
-        # Load static resources
+                    reserved_pos.append(tuple(pos))
+        template['reserved_pos'] = reserved_pos
+        # Static resources: [(name, position, amount), ...]
+        static_resources = []
         config = self.config.task.static.resources
         for c in config:
             names = c['name']
@@ -102,32 +84,12 @@ class GameEditor:
                 name = names[i % name_num]
                 pos = positions[i % pos_num]
                 num = nums[i % num_num]
-                resources.append(self._create_resource(
-                    name=name,
-                    position=pos,
-                    amount=num,
-                ))
-        # Load random resources
+                static_resources.append((name, tuple(pos), num))
+        template['static_resources'] = static_resources
         config = self.config.task.random.resources
-        conf_list = [c for c in config for _ in range(c['repeat'])]
-        resource_num = len(conf_list)
-        # TODO stackable = True
-        blank_pos = world_map.blank_pos.copy()
-        for resource in resources:
-            blank_pos.discard(resource.position)
-        pos_list = random.sample(list(blank_pos), resource_num)
-        resource_config = self.config['resource']
-        for conf, pos in zip(conf_list, pos_list):
-            resources.append(self._create_resource(
-                name=conf['name'],
-                position=pos,
-                amount=self._num_generator(conf['num']),
-            ))
-        return resources
-
-    def generate_events(self, world_map):
-        events = []
-        # Load static events
+        template['resource_confs'] = [c for c in config for _ in range(c['repeat'])]
+        # Static events: [(name, position), ...]
+        static_events = []
         config = self.config.task.static.events
         for c in config:
             names = c['name']
@@ -141,53 +103,181 @@ class GameEditor:
             for i in range(max(name_num, pos_num)):
                 name = names[i % name_num]
                 pos = positions[i % pos_num]
-                events.append(self._create_event(
-                    name=name,
-                    position=pos,
-                ))
-        # Load random events
+                static_events.append((name, tuple(pos)))
+        template['static_events'] = static_events
         config = self.config.task.random.events
-        conf_list = [c for c in config for _ in range(c['repeat'])]
-        event_num = len(conf_list)
-        blank_pos = world_map.blank_pos.copy()
-        for event in events:
-            blank_pos.discard(event.position)
-        pos_list = random.sample(list(blank_pos), event_num)
-        for conf, pos in zip(conf_list, pos_list):
-            events.append(self._create_event(
-                name = conf['name'],
-                position=pos,
-            ))
-        return events
-
-    def generate_players(self, world_map):
-        players = []
-        # Load static players
+        template['event_confs'] = [c for c in config for _ in range(c['repeat'])]
+        # Static players: [(job_name, position), ...]
+        static_players = []
         config = self.config.task.static.players
         for c in config:
-            job_name = c['job']
             positions = c['positions']
             if not isinstance(positions[0], list):
                 positions = [positions]
             for pos in positions:
-                player_id = len(players)
-                players.append(self._create_player(
-                    player_id=player_id,
-                    # name=NAME_LIST[player_id % len(NAME_LIST)],
-                    name=f'{job_name}_{player_id}',
-                    position=pos,
-                    rotation=None,
-                    job_name=job_name,
-                ))
-        # Load random players
+                static_players.append((c['job'], pos))
+        template['static_players'] = static_players
         config = self.config.task.random.players
-        conf_list = [c for c in config for _ in range(c['repeat'])]
         # TODO shuffle will break the name order, and thus break rllib training for now
         # random.shuffle(conf_list)
-        player_num = len(conf_list)
-        pos_list = random.sample(list(world_map.blank_pos), player_num)
-        for c, pos in zip(conf_list, pos_list):
-            job_name = c['job']
+        template['player_confs'] = [c for c in config for _ in range(c['repeat'])]
+        return template
+
+    def generate_game(self, obs_mode='dict', grid_view='fov', seed=None, freeze_physics=False):
+        # `freeze_physics`: skip the physical world during the social phase of the task (see
+        # `get_frozen_steps`), in which the task agents take social actions only
+        world_map = self.generate_map()
+        resources = self.generate_resources(world_map)
+        resource_grid = self.generate_resource_grid(world_map)
+        events = self.generate_events(world_map)
+        players = self.generate_players(world_map)
+        social = self.generate_social(players)
+        if seed is None:
+            # Keep the game reproducible under `random.seed`
+            seed = random.getrandbits(32)
+        game = Game(
+            world_map=world_map,
+            resources=resources,
+            resource_grid=resource_grid,
+            events=events,
+            players=players,
+            social=social,
+            social_schedule=self.config.task.static.social_schedule,
+            negotiation_steps=self.config.task.negotiation_steps,
+            pre_updates=self.config.task.pre_updates,
+            post_updates=self.config.task.post_updates,
+            max_length = self.config.task.max_length,
+            communication_length=self.config.task.static.get('communication_length', 0),
+            obs_mode=obs_mode,
+            grid_view=grid_view,
+            seed=seed,
+            frozen_steps=self.get_frozen_steps(len(players)) if freeze_physics else 0,
+        )
+        return game
+
+    def get_frozen_steps(self, player_num):
+        # Steps at the start of an episode in which the physical actions of the task agents are
+        # masked: the negotiation phase (up to step `negotiation_steps`) or the contract rounds
+        negotiation = self.config.task.negotiation
+        contract = self.config.task.contract
+        if 'negotiation_steps' in negotiation:
+            return negotiation['negotiation_steps'] + 1
+        if 'negotiation_round' in contract:
+            return contract['negotiation_round'] * player_num
+        return 0
+
+    def reset_game(self, game, seed=None, layout=None):
+        # Start a new episode of a game generated from this config, in place.
+        # Same as `generate_game` but only the placements are drawn again, unless a ready-made
+        # `layout` (see `draw_layout`) is given.
+        world_map = game.world_map
+        if layout is None:
+            layout = self.draw_layout(world_map)
+        else:
+            world_map.reset()
+            world_map.add_blocks(
+                [pos for pos, _ in layout['blocks']],
+                [token for _, token in layout['blocks']],
+            )
+        if seed is None:
+            seed = layout['seed']
+        if seed is None:
+            seed = random.getrandbits(32)
+        game.reset(
+            resource_placements=layout['resources'],
+            event_positions=layout['events'],
+            player_positions=layout['players'],
+            seed=seed,
+        )
+        return game
+
+    def draw_layout(self, world_map, rng=random, seed=None):
+        # Placements of an episode: blocks [(position, token), ...], resources
+        # [(position, amount), ...], events and players [position, ...].
+        # `world_map` is reset and left with the blocks of the layout.
+        world_map.reset()
+        return {
+            'seed': seed,
+            'blocks': self.add_random_blocks(world_map, rng),
+            'resources': [(pos, num) for _, pos, num in self.place_resources(world_map, rng)],
+            'events': [pos for _, pos in self.place_events(world_map, rng)],
+            'players': [pos for _, pos in self.place_players(world_map, rng)],
+        }
+
+    def generate_map(self):
+        world_map = self.generate_base_map()
+        self.add_random_blocks(world_map)
+        return world_map
+
+    def generate_base_map(self):
+        # Base
+        base_map_config = self.config['task']['base_map']
+        base_map_init_rule = base_map_config['init_rule']
+        if 'size' in base_map_config:
+            size_x, size_y = base_map_config['size']['x'], base_map_config['size']['y']
+        else:
+            size_x, size_y = None, None
+        file_path = base_map_config.get('file_path')
+        return self._load_map(base_map_init_rule, size_x, size_y, file_path)
+
+    def add_random_blocks(self, world_map, rng=random):
+        # Returns the added blocks [(position, token), ...]
+        template = self.template
+        block_num = len(template['block_confs'])
+        pos_list = world_map.sample_blank(block_num, exclude=template['reserved_pos'], rng=rng)
+        tokens = world_map.add_blocks(pos_list, rng=rng)
+        return list(zip(pos_list, tokens))
+
+    def generate_resources(self, world_map):
+        resources = []
+        for name, pos, num in self.place_resources(world_map):
+            resources.append(self._create_resource(
+                name=name,
+                position=pos,
+                amount=num,
+            ))
+        return resources
+
+    def place_resources(self, world_map, rng=random):
+        # [(name, position, amount), ...] of the static and then the random resources
+        template = self.template
+        placements = list(template['static_resources'])
+        # Random resources
+        conf_list = template['resource_confs']
+        resource_num = len(conf_list)
+        # TODO stackable = True
+        pos_list = world_map.sample_blank(resource_num, exclude=[pos for _, pos, _ in placements], rng=rng)
+        for conf, pos in zip(conf_list, pos_list):
+            placements.append((conf['name'], pos, self._num_generator(conf['num'], rng=rng)))
+        return placements
+
+    def generate_resource_grid(self, world_map):
+        return ResourceGrid(*world_map.shape, resource_config=self.config['resource'])
+
+    def generate_events(self, world_map):
+        events = []
+        for name, pos in self.place_events(world_map):
+            events.append(self._create_event(
+                name=name,
+                position=pos,
+            ))
+        return events
+
+    def place_events(self, world_map, rng=random):
+        # [(name, position), ...] of the static and then the random events
+        template = self.template
+        placements = list(template['static_events'])
+        # Random events
+        conf_list = template['event_confs']
+        event_num = len(conf_list)
+        pos_list = world_map.sample_blank(event_num, exclude=[pos for _, pos in placements], rng=rng)
+        for conf, pos in zip(conf_list, pos_list):
+            placements.append((conf['name'], pos))
+        return placements
+
+    def generate_players(self, world_map):
+        players = []
+        for job_name, pos in self.place_players(world_map):
             player_id = len(players)
             players.append(self._create_player(
                 player_id=player_id,
@@ -200,6 +290,18 @@ class GameEditor:
             ))
         return players
 
+    def place_players(self, world_map, rng=random):
+        # [(job_name, position), ...] of the static and then the random players
+        template = self.template
+        placements = list(template['static_players'])
+        # Random players
+        conf_list = template['player_confs']
+        player_num = len(conf_list)
+        pos_list = world_map.sample_blank(player_num, rng=rng)
+        for c, pos in zip(conf_list, pos_list):
+            placements.append((c['job'], pos))
+        return placements
+
     def generate_social(self, players):
         social = Social(players)
         groups = []
@@ -226,7 +328,7 @@ class GameEditor:
         # TODO Load random relations
         return social
 
-    def _num_generator(self, config, index=None):
+    def _num_generator(self, config, index=None, rng=random):
         rule = config['rule']
         if rule == 'static':
             return config['num']
@@ -239,7 +341,7 @@ class GameEditor:
             max_n = config['max']
             if dist == 'uniform':
                 if dtype == 'int':
-                    return random.randint(min_n, max_n)
+                    return rng.randint(min_n, max_n)
                 else:
                     raise NotImplementedError
             else:
@@ -260,18 +362,36 @@ class GameEditor:
             )
             return WorldMap(token_array, token_lookup_table=MAP_STR_DICT)
         elif init_rule == 'map_file':
-            unit_str_len = 1
-            with open(file_path, 'r') as f:
-                for line in f.readlines():
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    token_array.append([line[i:i+unit_str_len] for i in range(0, len(line), unit_str_len)])
-            world_map = WorldMap(token_array)
-            return world_map
+            if self.map_store is not None:
+                return self.map_store.load(file_path, self._load_map_file, padding=self._fov_padding())
+            return self._load_map_file(file_path)
         else:
             raise NotImplementedError
 
+    def _fov_padding(self):
+        # (pad_x, pad_y) the FOV windows of all the jobs need, see `WorldMap.pad`
+        pad_x, pad_y = 0, 0
+        for job_config in self.config['job'].values():
+            fov = job_config['fov']
+            h, v = (fov, fov) if isinstance(fov, int) else fov
+            pad_x, pad_y = max(pad_x, h), max(pad_y, v)
+        return pad_x, pad_y
+
+    def _load_map_file(self, file_path):
+        if file_path.endswith('.npy'):
+            # Binary map (see `WorldMap.save`), memory-mapped
+            return WorldMap.load(file_path)
+        token_array = []
+        unit_str_len = 1
+        with open(file_path, 'r') as f:
+            for line in f.readlines():
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                token_array.append([line[i:i+unit_str_len] for i in range(0, len(line), unit_str_len)])
+        world_map = WorldMap(token_array)
+        return world_map
+
     def _create_resource(self, name, position, amount):
         config = self.config['resource']
         return Resource(
@@ -285,20 +405,13 @@ class GameEditor:
 
     def _create_event(self, name, position):
         config = self.config['event']
-        resource_pool = {}
-        for resource_name in config[name].get('out', {}):
-            resource_pool[resource_name] = self._create_resource(
-                name=resource_name,
-                position=None,
-                amount=float('inf'),
-            )
         return Event(
             name=name,
             position=position,
             inputs=config[name].get('in', {}),
             outputs=config[name].get('out', {}),
-            resource_pool=resource_pool,
             requirements=config[name].get('requirements', {}),
+            avail_interval=config[name].get('avail_interval', 0),
         )
 
     def _create_player(self, player_id, name, job_name, position, rotation):
@@ -319,6 +432,8 @@ class GameEditor:
             rotation=rotation,
             fov=job_config['fov'],
             inventory_size=inventory_config.get('size', float('inf')),
+            resource_names=list(self.config['resource'].keys()),
+            resource_scores=[c.get('score', 0) for c in self.config['resource'].values()],
             init_resources=init_resources,
             resource_max_dict=dict(inventory_config.get('max', {})),
             resource_preference_dict=dict(inventory_config.get('score', {})),
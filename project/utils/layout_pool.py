@@ -0,0 +1,43 @@
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def draw_layout(game_editor, seed):
+    # Runs in a worker: a layout on a map of its own, from its own random generator
+    world_map = game_editor.generate_base_map()
+    return game_editor.draw_layout(world_map, rng=random.Random(seed), seed=seed)
+
+
+class LayoutPool:
+    # Draws the layouts of upcoming episodes (see `GameEditor.draw_layout`) in the background,
+    # keeping `size` of them in flight, each from its own seed
+    def __init__(self, game_editor, size=4, seed=None, processes=False, max_workers=1):
+        self.game_editor = game_editor
+        # Compile the template before the editor is shared with the workers
+        game_editor.compile_template()
+        self.size = size
+        if seed is None:
+            seed = random.getrandbits(32)
+        self._seeds = random.Random(seed)
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=max_workers)
+        self._pending = deque()
+        for _ in range(size):
+            self._submit()
+
+    def _submit(self):
+        seed = self._seeds.getrandbits(32)
+        self._pending.append(self.executor.submit(draw_layout, self.game_editor, seed))
+
+    def get(self):
+        # The next layout, waiting for it if it is not ready yet
+        layout = self._pending.popleft().result()
+        self._submit()
+        return layout
+
+    def close(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ..env.world_map import WorldMap
+
+
+class MapStore:
+    # Static maps shared by all the games of a machine. Each map file is converted once into
+    # binary files in `cache_dir` (tokens, map data and token lookup table), which every world
+    # map then memory-maps copy-on-write: the pages are shared, and only the cells changed by
+    # random blocks are copied into the memory of a game. The map data is stored wrap-padded for
+    # the FOV windows (see `WorldMap.pad`), once per padding.
+    # `cache_dir` is owned by the store: `clear` removes it with all the cached maps.
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def load(self, file_path, load_map, padding=(0, 0)):
+        # World map of `file_path`, built by `load_map(file_path)` on the first use only, with its
+        # map data padded by `padding` (pad_x, pad_y)
+        prefix = self._cache_prefix(file_path)
+        if not os.path.exists(prefix + '.json'):
+            self._save(prefix, load_map(file_path))
+        with open(prefix + '.json', 'r') as f:
+            token_lookup_table = json.load(f)
+        pad_x, pad_y = padding
+        data_path = prefix + '.data.npy'
+        if pad_x or pad_y:
+            data_path = f'{prefix}.data.{pad_x}x{pad_y}.npy'
+        if not os.path.exists(data_path):
+            map_data = np.load(prefix + '.data.npy', mmap_mode='r')
+            padded_data = np.pad(map_data, ((pad_y, pad_y), (pad_x, pad_x)), mode='wrap')
+            self._save_file(data_path, lambda f: np.save(f, padded_data))
+        return WorldMap(
+            np.load(prefix + '.tokens.npy', mmap_mode='c'),
+            token_lookup_table=token_lookup_table,
+            map_data=np.load(data_path, mmap_mode='c'),
+            padding=padding,
+        )
+
+    def clear(self):
+        # Remove the cached maps, e.g. once no environment uses them anymore. Games still
+        # holding memory-mapped maps keep them until they are dropped.
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _cache_prefix(self, file_path):
+        # Keyed by the path and version of the map file
+        stat = os.stat(file_path)
+        key = f'{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}'
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def _save(self, prefix, world_map):
+        # Written to temporary files and renamed, so that other processes never see a partial
+        # map. The lookup table goes last, as it marks the map as complete.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._save_file(prefix + '.tokens.npy', lambda f: np.save(f, np.asarray(world_map.token_array, dtype=str)))
+        self._save_file(prefix + '.data.npy', lambda f: np.save(f, world_map.map_data))
+        self._save_file(prefix + '.json', lambda f: f.write(json.dumps(world_map.token_lookup_table).encode()))
+
+    def _save_file(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+_map_stores = {}
+
+
+def get_map_store(cache_dir):
+    # Map store of `cache_dir`, shared by the environments of this process
+    cache_dir = os.path.abspath(cache_dir)
+    if cache_dir not in _map_stores:
+        _map_stores[cache_dir] = MapStore(cache_dir)
+    return _map_stores[cache_dir]
@@ -44,6 +44,8 @@ def parse_args():
 
     #===Env directory===
     parser.add_argument('--env_dir', type=str, default='./config/main.json', help='environment directory')
+    parser.add_argument('--obs_mode', type=str, choices=['dict', 'tensor'], default='dict',
+                        help='observations as JSON-style dicts, or as arrays built by the environment')
 
     args = parser.parse_args()
     if args.lstm and args.algo == "Rainbow":
@@ -0,0 +1,30 @@
+import json
+import os
+
+import pytest
+
+from project.utils.config import Config
+from project.utils.game_editor import GameEditor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config(task):
+    # Config of `task` as in config/main.json
+    config = Config()
+    for key, path in [
+        ('task', f'config/task/{task}.json'),
+        ('job', 'config/common/job.json'),
+        ('resource', 'config/common/resource.json'),
+        ('event', 'config/common/event.json'),
+    ]:
+        with open(os.path.join(ROOT, path)) as f:
+            config[key] = json.load(f)
+    return config
+
+
+@pytest.fixture
+def make_editor():
+    def make(task):
+        return GameEditor(load_config(task))
+    return make
@@ -0,0 +1,10 @@
+import pytest
+
+from project.env.action_codes import encode_action
+
+
+def test_encode_action_rejects_unsupported_actions():
+    with pytest.raises(ValueError):
+        encode_action(['move_up', 'move_down'], {})
+    with pytest.raises(ValueError):
+        encode_action('communicate', {})
@@ -0,0 +1,83 @@
+import pytest
+
+
+@pytest.fixture
+def game(make_editor):
+    game = make_editor('social_structure_ovlp_group').generate_game()
+    game.social.clear_graph()
+    return game
+
+
+def make_group(social, *players, attr='score'):
+    group = social.create_group()
+    for player in players:
+        social.join_group(player, group, **{attr: 1})
+    return group
+
+
+def test_merge_relation_joins_the_groups_of_an_overlapping_player(game):
+    social = game.social
+    a, b, c, d = game.players[:4]
+    g1 = make_group(social, a, b)
+    g2 = make_group(social, b, c)
+    social.add_relation(d, c, score=1)
+    social.add_relation(c, d, score=1)
+
+    game._post_update_merge_relation_to_group('score', 'score')
+
+    assert d in g2.players
+    assert d not in g1.players
+    assert d.groups == {g2}
+    assert not social.has_relation(d, c) and not social.has_relation(c, d)
+
+
+def test_merge_relation_merges_every_group_of_other(game):
+    social = game.social
+    a, b, c, d = game.players[:4]
+    g1 = make_group(social, a)
+    g2 = make_group(social, b, c)
+    g3 = make_group(social, c, d)
+    social.add_relation(a, c, score=1)
+    social.add_relation(c, a, score=1)
+
+    game._post_update_merge_relation_to_group('score', 'score')
+
+    assert set(g1.players) == {a, b, c, d}
+    assert g2._id not in social.group_dict and g3._id not in social.group_dict
+    assert all(player.groups == {g1} for player in (a, b, c, d))
+
+
+def test_relation_to_group_forms_groups_from_cycles(game):
+    social = game.social
+    a, b, c, d = game.players[:4]
+    social.add_relation(a, b, attribute='ally', ally=1)
+    social.add_relation(b, c, attribute='ally', ally=2)
+    social.add_relation(c, a, attribute='ally', ally=3)
+    social.add_relation(c, d, attribute='ally', ally=4)
+
+    game._post_update_relation_to_group('ally', 'score')
+
+    assert len(social.group_dict) == 1
+    group = next(iter(social.group_dict.values()))
+    assert set(group.players) == {a, b, c}
+    assert [social.get_relation(group, player)['score'] for player in (a, b, c)] == [1, 2, 3]
+    assert not social.has_relation(a, b) and not social.has_relation(c, a)
+    assert social.get_relation(c, d) == {'attribute': 'ally', 'ally': 4}
+
+
+def test_removed_groups_are_described_until_their_changes_are_forgotten(game):
+    social = game.social
+    a, b = game.players[:2]
+    version = social.graph.version
+    for _ in range(5):
+        group = make_group(social, a, b)
+        social.remove_group(group)
+        changes = social.get_changes(version)
+        assert changes['nodes_removed'] == [{'type': 'group', 'group': {'id': group._id}}]
+        social.forget_changes(version)
+        version = social.graph.version
+    # Only the removal reported last can still be asked for
+    assert len(social._node_attrs) == len(game.players) + 1
+    social.forget_changes(version)
+    assert len(social._node_attrs) == len(game.players)
+    assert social.get_changes(version)['nodes_removed'] == []
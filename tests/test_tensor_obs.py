@@ -0,0 +1,52 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+from project.agent.mdp.state import State
+
+MOVES = ['no_act', 'move_up', 'move_down', 'move_left', 'move_right']
+
+
+def make_state(game, player, config):
+    env_info = {
+        '_id': player._id,
+        'map_size': game.world_map.shape,
+        'resource_name': game.resource_names,
+        'inventory_capacity': player.resource_max_dict,
+        'events': config['event'],
+        'player_num': game.player_num,
+        'obs_range': player.fov,
+        'max_length': game.max_length,
+        'nodes': game.social.get_node_list(),
+    }
+    return State(player._id, env_info, SimpleNamespace(static={}))
+
+
+def test_map_view_matches_the_dict_pipeline(make_editor):
+    # Players share their map with two others, seen or not, as in the exploration task
+    editor = make_editor('exploration')
+    games = {}
+    for obs_mode in ['dict', 'tensor']:
+        random.seed(0)
+        game = editor.generate_game(obs_mode=obs_mode, grid_view='map', seed=0)
+        for player in game.players:
+            for offset in [1, 3]:
+                other = game.players[(player._id + offset) % game.player_num]
+                game.social.add_relation(player, other, sharing={'Map': True})
+        games[obs_mode] = game
+    states = {player.name: make_state(games['dict'], player, editor.config) for player in games['dict'].players}
+    rng = random.Random(1)
+    for step in range(30):
+        action_dict = {player.name: [rng.choice(MOVES)] for player in games['dict'].players}
+        for game in games.values():
+            game.pre_update()
+            game.update(action_dict)
+            game.post_update()
+        for player in games['dict'].players:
+            state = states[player.name]
+            obs, sharing_players, sharing_blocks = state.sharing_obs(games['dict'].observations[player.name])
+            expected = state.process_obs(obs, sharing_players, sharing_blocks)['grid_observation']
+            grid = games['tensor'].observations[player.name]['grid_observation']
+            assert grid.dtype == expected.dtype
+            assert np.array_equal(grid, expected), (step, player.name)
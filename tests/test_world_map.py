@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+
+from project.env import world_map as world_map_module
+from project.env.world_map import BLANK, WorldMap
+
+
+def box_map(size):
+    token_array = [['#'] * size] + [['#'] + [' '] * (size - 2) + ['#'] for _ in range(size - 2)] + [['#'] * size]
+    return WorldMap(token_array)
+
+
+def test_small_maps_sample_as_the_blank_set_did():
+    world_map = box_map(13)
+    blank_pos = set(map(tuple, np.argwhere(world_map.map_data.T == BLANK).tolist()))
+    world_map.add_block((3, 4), token='#')
+    blank_pos.discard((3, 4))
+    exclude = [(5, 5), (6, 7)]
+
+    random.seed(0)
+    positions = world_map.sample_blank(10, exclude=exclude)
+    random.seed(0)
+    expected = blank_pos.copy()
+    for pos in exclude:
+        expected.discard(pos)
+    assert positions == random.sample(list(expected), 10)
+
+    random.seed(0)
+    positions = world_map.sample_blank(10)
+    random.seed(0)
+    assert positions == random.sample(list(blank_pos), 10)
+
+
+@pytest.mark.parametrize('blank_cells', [10, 200])
+def test_large_maps_sample_distinct_blank_cells(monkeypatch, blank_cells):
+    monkeypatch.setattr(world_map_module, 'SET_SAMPLING_CELLS', 0)
+    world_map = box_map(20)
+    assert world_map.blank_pos is None
+    blanks = list(map(tuple, np.argwhere(world_map.map_data.T == BLANK).tolist()))
+    for pos in blanks[blank_cells:]:
+        world_map.add_block(pos, token='#')
+    exclude = blanks[:2]
+
+    positions = world_map.sample_blank(blank_cells - 2, exclude=exclude, rng=random.Random(0))
+
+    assert sorted(positions) == sorted(blanks[2:blank_cells])
+    with pytest.raises(ValueError):
+        world_map.sample_blank(blank_cells - 1, exclude=exclude)
+
+
+def test_reset_samples_as_a_new_map():
+    world_map = box_map(13)
+    random.seed(1)
+    expected = world_map.sample_blank(5)
+    world_map.add_blocks(world_map.sample_blank(20), tokens=['#'] * 20)
+    world_map.reset()
+    random.seed(1)
+    assert world_map.sample_blank(5) == expected
+
+
+def test_padded_map_data_is_used_in_place():
+    world_map = box_map(13)
+    padded_data = np.pad(world_map.map_data, ((3, 3), (2, 2)), mode='wrap')
+    padded_map = WorldMap(world_map.token_array, world_map.token_lookup_table, map_data=padded_data, padding=(2, 3))
+    assert np.array_equal(padded_map.map_data, world_map.map_data)
+    for position in [(0, 0), (4, 12), (11, 6)]:
+        world_map.add_block(position, token='#')
+        padded_map.add_block(position, token='#')
+        assert padded_map.padded_data is padded_data
+        for x, y in [(0, 0), (1, 12), (12, 5)]:
+            expected = padded_map.grids(x - 2, x + 3, y - 3, y + 4)
+            assert np.array_equal(padded_map.window((x, y), (2, 3)), expected)
+            assert np.array_equal(world_map.window((x, y), (2, 3)), expected)